@@ -1,15 +1,28 @@
+import os
+import threading
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import plotly.graph_objs as go
 import plotly.express as px
 import pandas as pd
-from features.data_retrieval import stock_symbols, historical_returns, market_index_returns
-from features.portfolio_construction import optimal_weights_mvo, optimal_weights_mvp, optimal_weights_max_div
-from features.risk_analysis import calculate_portfolio_returns, align_data, calculate_standard_deviation, calculate_sharpe_ratio, calculate_sortino_ratio, calculate_beta, calculate_treynor_ratio
+from features.compute import warm_in_background
+from features.instrumentation import install_metrics_endpoint, metrics, timed
+from features.result_cache import LRUCache
+from features.data_retrieval import stock_symbols, historical_returns_node, market_index_returns_node, market_index_symbol
+from features.universe import add_symbol, consistent_get, remove_symbol, return_moments_node
+from features.portfolio_construction import PortfolioProblem, optimal_weights_mvo_node, optimal_weights_mvp_node, optimal_weights_max_div_node, optimal_weights_hrp_node
+from features.efficient_frontier import efficient_frontier_node, plot_efficient_frontier
+from features.risk_analysis import calculate_risk_metrics_batch
+from features.returns_matrix import returns_matrix_node
+from features.rolling_risk import calculate_rolling_metrics, plot_rolling_metrics
+from features.live_feeds import feed_from_env
+from features.live_stream import LiveSession, live_extend_data, live_figures
+from features.downsampling import downsample_frame, relayout_x_range
+from features.simulation import simulate_portfolio_risk
 from features.return_analysis import calculate_cumulative_returns
-from features.diversification_analysis import calculate_portfolio_variance, calculate_diversification_ratio, calculate_effective_number_of_assets, correlation_heatmap
+from features.diversification_analysis import calculate_portfolio_variance, calculate_diversification_ratio, calculate_effective_number_of_assets, correlation_heatmap_node, correlation_clusters_node, plot_correlation_heatmap
 
 # external JavaScript files
 external_scripts = [
@@ -31,6 +44,22 @@ external_stylesheets = [
 ]
 
 
+# You'll need the risk-free rate for some of these calculations.
+# For example, use a typical value like 0.02 (or 2%) for the risk-free rate, or fetch the current rate.
+risk_free_rate = 0.02
+
+# Live mode: seconds between two ticks of the simulated feed (and between two
+# chart updates), and number of points kept on each live chart.
+live_interval = float(os.environ.get('PORTFOLIO_LIVE_INTERVAL', '1'))
+live_max_points = int(os.environ.get('PORTFOLIO_LIVE_MAX_POINTS', '2000'))
+# Live sessions are kept in the memory of the serving process, so live mode
+# needs a single server process; wsgi.py turns it off by default.
+live_mode = os.environ.get('PORTFOLIO_LIVE_MODE', '1') == '1'
+
+# Optional debug panel listing where time goes in this server process.
+debug_panel = os.environ.get('PORTFOLIO_DEBUG_PANEL', '0') == '1'
+
+
 def create_comparison_df(portfolio_df, benchmark_df):
     returns_df = pd.concat(
         [portfolio_df, benchmark_df], axis=1).dropna()
@@ -45,60 +74,209 @@ def create_comparison_df(portfolio_df, benchmark_df):
 app = dash.Dash(__name__, external_scripts=external_scripts,
                 external_stylesheets=external_stylesheets)
 
-# Define the app layout
-app.layout = html.Div([
-    html.Div(id='trigger', style={'display': 'none'}),
-    html.H1("Portfolio Management Dashboard", style={
-            'textAlign': 'center'}, className='p-3 mb-2 bg-light text-dark'),
-    html.Div(children=[html.B('Stocks in portfolio: '), html.Span(
-        ', '.join(stock_symbols))], className='p-2 mb-2'),
-    html.Div(children=[html.B('Choose optimization technique to construct portfolio: '), dcc.Dropdown(
-        id='opt-dropdown',
-        options=[
-            {'label': 'Mean Variance', 'value': 'mev'},
-            {'label': 'Minimum Variance', 'value': 'miv'},
-            {'label': 'Maximum Diversification', 'value': 'mad'}
-        ],
-        value='mev'
-    )], className='p-2 mb-2'),
-    html.Div(children=[html.B('Optimal weights of the stocks calculated by Mean Variance Optimization'), html.Div(
-        id='weights')], className='p-2 mb-2'),
-    html.Div(children=[html.B('Risk Analysis'), html.Div(
-        id='risk-metrics')], className='p-2 mb-2'),
-    html.Div(children=[html.Div(
-        id='portfolio-returns-time-series')], className='p-2 mb-2'),
-    html.Div(children=[html.Div(
-        id='cumulative-returns-time-series')], className='p-2 mb-2'),
-    html.Div(children=[html.B('Diversification Analysis'), html.Div(
-        id='diversification-metrics')], className='p-2 mb-2'),
-    html.Div(children=[dcc.Graph(
-        figure=correlation_heatmap)], className='p-2 mb-2')
-])
+
+# The layout is served by a function so that every page load shows the current
+# universe, including tickers added or removed since the server started.
+def serve_layout():
+    children = [
+        html.Div(id='trigger', style={'display': 'none'}),
+        dcc.Store(id='viewport-width'),
+        html.H1("Portfolio Management Dashboard", style={
+                'textAlign': 'center'}, className='p-3 mb-2 bg-light text-dark'),
+        html.Div(children=[html.B('Stocks in portfolio: '), html.Span(
+            ', '.join(stock_symbols), id='stock-list')], className='p-2 mb-2'),
+        html.Div(children=[dcc.Store(id='universe-version', data=0), dcc.Input(
+            id='add-symbol', placeholder='Ticker, e.g. TCS.NS', type='text'), html.Button(
+            'Add', id='add-symbol-button', className='btn btn-light btn-sm'), dcc.Dropdown(
+            id='remove-symbol', options=[{'label': symbol, 'value': symbol} for symbol in stock_symbols],
+            placeholder='Ticker to remove', style={'width': '250px', 'display': 'inline-block'}), html.Button(
+            'Remove', id='remove-symbol-button', className='btn btn-light btn-sm'), html.Span(
+            id='universe-status', className='p-2')], className='p-2 mb-2'),
+        html.Div(children=[html.B('Choose optimization technique to construct portfolio: '), dcc.Dropdown(
+            id='opt-dropdown',
+            options=[
+                {'label': 'Mean Variance', 'value': 'mev'},
+                {'label': 'Minimum Variance', 'value': 'miv'},
+                {'label': 'Maximum Diversification', 'value': 'mad'},
+                {'label': 'Hierarchical Risk Parity', 'value': 'hrp'}
+            ],
+            value='mev'
+        )], className='p-2 mb-2'),
+        html.Div(children=[html.B('Optimal weights of the stocks calculated by Mean Variance Optimization'), html.Div(
+            id='weights')], className='p-2 mb-2'),
+        html.Div(children=[html.B('Risk Analysis'), html.Div(
+            id='risk-metrics')], className='p-2 mb-2'),
+        html.Div(children=[html.B('Monte Carlo Simulation (1 year horizon)'), html.Div(
+            id='simulation-metrics')], className='p-2 mb-2'),
+        html.Div(children=[dcc.Graph(
+            id='portfolio-returns-time-series-fig')], id='portfolio-returns-time-series', className='p-2 mb-2'),
+        html.Div(children=[dcc.Graph(
+            id='cumulative-returns-time-series-fig')], id='cumulative-returns-time-series', className='p-2 mb-2'),
+        html.Div(children=[html.B('Rolling window (trading days): '), dcc.Dropdown(
+            id='rolling-window',
+            options=[
+                {'label': '3 months', 'value': 63},
+                {'label': '6 months', 'value': 126},
+                {'label': '1 year', 'value': 252}
+            ],
+            value=126
+        ), dcc.Graph(id='rolling-risk-time-series')], className='p-2 mb-2'),
+        html.Div(children=[dcc.Checklist(
+            id='live-toggle', options=[{
+                'label': ' Live mode: stream intraday prices' if live_mode else
+                ' Live mode: only available with a single server process',
+                'value': 'on', 'disabled': not live_mode}],
+            value=[]), dcc.Store(id='live-cursor'), dcc.Interval(
+            id='live-interval', interval=int(1000 * live_interval), disabled=True), html.Div(children=[
+            html.Div(id='live-metrics'), dcc.Graph(id='live-returns'), dcc.Graph(
+            id='live-cumulative-returns'), dcc.Graph(id='live-risk')], id='live-charts',
+            style={'display': 'none'})], className='p-2 mb-2'),
+        html.Div(children=[html.B('Diversification Analysis'), html.Div(
+            id='diversification-metrics')], className='p-2 mb-2'),
+        html.Div(children=[dcc.Graph(
+            id='efficient-frontier')], className='p-2 mb-2'),
+        html.Div(children=[dcc.Store(id='heatmap-view'), html.Button(
+            'Show all clusters', id='heatmap-reset', className='btn btn-light btn-sm'), dcc.Graph(
+            id='correlation-heatmap')], className='p-2 mb-2')
+    ]
+    if debug_panel:
+        children.append(html.Div(children=[
+            html.B('Performance (this process)'), html.Div(id='debug-panel'),
+            dcc.Interval(id='debug-panel-interval', interval=5000)], className='p-2 mb-2'))
+    return html.Div(children)
+
+
+app.layout = serve_layout
+
+# Report the browser width once so figures are downsampled to a matching resolution.
+app.clientside_callback(
+    'function(_) { return window.innerWidth; }',
+    Output('viewport-width', 'data'),
+    [Input('trigger', 'children')]
+)
+
+# Downsampling of the return time series: 'lttb', 'minmax' or 'none'.
+downsampling_method = os.environ.get('PORTFOLIO_DOWNSAMPLING', 'lttb')
+
+# Number of Monte Carlo paths behind the simulated risk metrics.
+simulation_paths = int(os.environ.get('PORTFOLIO_SIMULATION_PATHS', '20000'))
+
+# Bounded cache of computed tables and serialized figures, keyed by
+# optimization method, data version and universe.
+analysis_cache = LRUCache(maxsize=int(os.environ.get('PORTFOLIO_RESULT_CACHE_SIZE', '64')))
+
+metrics.register_cache('analysis', analysis_cache)
+install_metrics_endpoint(app.server)
+
+optimal_weights_nodes = {
+    'mev': optimal_weights_mvo_node,
+    'miv': optimal_weights_mvp_node,
+    'mad': optimal_weights_max_div_node,
+    'hrp': optimal_weights_hrp_node,
+}
+
+
+@app.callback(
+    Output('efficient-frontier', 'figure'),
+    [Input('universe-version', 'data')]
+)
+@timed('callback.update_efficient_frontier')
+def update_efficient_frontier(_):
+    moments, (frontier, _), *all_weights = consistent_get(
+        return_moments_node, efficient_frontier_node, *optimal_weights_nodes.values())
+    # The markers use the same annualised mean and covariance backend as the
+    # frontier, so the portfolios sit on or under the curve.
+    problem = PortfolioProblem(moments.mean, moments.covariance)
+    labels = {'mev': 'Mean Variance', 'miv': 'Minimum Variance',
+              'mad': 'Maximum Diversification', 'hrp': 'Hierarchical Risk Parity'}
+    portfolios = {}
+    for value, weights in zip(optimal_weights_nodes, all_weights):
+        portfolios[labels[value]] = (weights @ problem.mean, problem.volatility(weights))
+    return plot_efficient_frontier(frontier, portfolios)
+
+
+@app.callback(
+    [Output('universe-version', 'data'), Output('stock-list', 'children'),
+     Output('remove-symbol', 'options'), Output('universe-status', 'children')],
+    [Input('add-symbol-button', 'n_clicks'), Input('remove-symbol-button', 'n_clicks')],
+    [State('add-symbol', 'value'), State('remove-symbol', 'value'), State('universe-version', 'data')]
+)
+@timed('callback.edit_universe')
+def edit_universe(_, __, new_symbol, old_symbol, version):
+    """ Add or remove a ticker; only the edited symbol is fetched and re-estimated. """
+    triggered = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    status = ''
+    try:
+        if 'add-symbol-button.n_clicks' in triggered and new_symbol:
+            add_symbol(new_symbol.strip().upper())
+            status, version = f'Added {new_symbol.strip().upper()}', (version or 0) + 1
+        elif 'remove-symbol-button.n_clicks' in triggered and old_symbol:
+            remove_symbol(old_symbol)
+            status, version = f'Removed {old_symbol}', (version or 0) + 1
+    except Exception as e:
+        status = f'Error: {e}'
+    options = [{'label': symbol, 'value': symbol} for symbol in stock_symbols]
+    return version, ', '.join(stock_symbols), options, status
 
 
 @app.callback(
-    [
-        Output('weights', 'children'),
-        Output('risk-metrics', 'children'),
-        Output('portfolio-returns-time-series', 'children'),
-        Output('cumulative-returns-time-series', 'children'),
-        Output('diversification-metrics', 'children'),
-    ],
-    [Input('opt-dropdown', 'value')]
+    Output('heatmap-view', 'data'),
+    [Input('correlation-heatmap', 'clickData'), Input('heatmap-reset', 'n_clicks'),
+     Input('universe-version', 'data')],
+    [State('heatmap-view', 'data')]
 )
-def update_weights_table(value):
-    if value == 'mev':
-        optimal_weights = optimal_weights_mvo
-    elif value == 'miv':
-        optimal_weights = optimal_weights_mvp
-    elif value == 'mad':
-        optimal_weights = optimal_weights_max_div
+@timed('callback.update_heatmap_view')
+def update_heatmap_view(click_data, _, __, view):
+    """ Drill into the clicked block of the heatmap, or back out to all clusters. """
+    triggered = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    if 'correlation-heatmap.clickData' not in triggered or not click_data:
+        return None
+    row_start, row_end, column_start, column_end = map(
+        int, click_data['points'][0]['customdata'].split(','))
+    if row_end - row_start == 1 and column_end - column_start == 1:
+        return view
+    return [row_start, row_end, column_start, column_end]
+
+
+@app.callback(
+    Output('correlation-heatmap', 'figure'),
+    [Input('heatmap-view', 'data')]
+)
+@timed('callback.update_correlation_heatmap')
+def update_correlation_heatmap(view):
+    if not view:
+        return correlation_heatmap_node.get()
+    return analysis_cache.get_or_compute(
+        analysis_key('heatmap', tuple(view)),
+        lambda: plot_correlation_heatmap(None, clusters=correlation_clusters_node.get(),
+                                         view=view).to_dict())
+
+
+def analysis_key(*args):
+    """ Cache key of a result derived from the current data and universe. """
+    historical_returns_node.get()
+    market_index_returns_node.get()
+    return args + (historical_returns_node.version, market_index_returns_node.version,
+                   tuple(stock_symbols))
+
+
+def portfolio_analysis(value):
+    """ Return the (cached) tables and figures for an optimization method. """
+    return analysis_cache.get_or_compute(
+        analysis_key('analysis', value), lambda: compute_portfolio_analysis(value))
+
+
+def compute_portfolio_analysis(value):
+    # Weights, returns and moments must all come from the same universe.
+    optimal_weights, historical_returns, moments = consistent_get(
+        optimal_weights_nodes[value], returns_matrix_node, return_moments_node)
+    symbols = historical_returns.columns
 
     ########################### Get weight of different stocks in portfolio ###########################
     weights_table_row = []
-    for i in range(0, len(stock_symbols)):
+    for i in range(0, len(symbols)):
         weights_table_row.append(
-            html.Tr([html.Td(stock_symbols[i]), html.Td(round(optimal_weights[i] * 100, 2))]))
+            html.Tr([html.Td(symbols[i]), html.Td(round(optimal_weights[i] * 100, 2))]))
 
     weights_table = html.Table([
         html.Thead(
@@ -108,33 +286,14 @@ def update_weights_table(value):
     ])
 
     ########################### Get risk metrics from risk analysis ###########################
-    portfolio_daily_returns = calculate_portfolio_returns(
-        historical_returns, optimal_weights)
-    portfolio_daily_returns, index_daily_returns = align_data(
-        portfolio_daily_returns, market_index_returns)
-    standard_deviation = calculate_standard_deviation(portfolio_daily_returns)
-
-    # You'll need the risk-free rate for some of these calculations.
-    # For example, use a typical value like 0.02 (or 2%) for the risk-free rate, or fetch the current rate.
-    risk_free_rate = 0.02
-
-    sharpe_ratio = calculate_sharpe_ratio(
-        portfolio_daily_returns, risk_free_rate)
-    sortino_ratio = calculate_sortino_ratio(
-        portfolio_daily_returns, risk_free_rate)
-
-    # If calculating beta, you'll need the market index returns as well.
-    beta = calculate_beta(portfolio_daily_returns, index_daily_returns)
-    treynor_ratio = calculate_treynor_ratio(
-        portfolio_daily_returns, beta, risk_free_rate)
-
-    risk_metrics = [
-        {'metric': 'Standard Deviation', 'value': standard_deviation},
-        {'metric': 'Beta', 'value': beta},
-        {'metric': 'Sharpe Ratio', 'value': sharpe_ratio},
-        {'metric': 'Sortino Ratio', 'value': sortino_ratio},
-        {'metric': 'Treynor Ratio', 'value': treynor_ratio},
-    ]
+    portfolio_daily_returns, index_daily_returns = historical_returns.aligned_portfolio(
+        optimal_weights)
+
+    # All risk metrics for the selected portfolio in one batched calculation.
+    batch_metrics = calculate_risk_metrics_batch(
+        historical_returns, optimal_weights, None, risk_free_rate).iloc[0]
+    risk_metrics = [{'metric': metric, 'value': value}
+                    for metric, value in batch_metrics.items()]
     risk_metrics_row = []
     for i in range(0, len(risk_metrics)):
         risk_metrics_row.append(
@@ -148,36 +307,23 @@ def update_weights_table(value):
     ])
 
     ########################### Create graphs for return analysis ###########################
-    daily_comparison_fig = px.line(create_comparison_df(
-        portfolio_daily_returns, index_daily_returns))
-    daily_comparison_fig.update_layout(
-        title='Portfolio Returns v/s Benchmark Returns')
-
-    daily_comparison_graph = dcc.Graph(
-        id='portfolio-returns-time-series-fig',
-        figure=daily_comparison_fig
-    )
+    daily_comparison_df = create_comparison_df(
+        portfolio_daily_returns, index_daily_returns)
 
     portfolio_cumulative_returns = calculate_cumulative_returns(
         portfolio_daily_returns)
     benchmark_cumulative_returns = calculate_cumulative_returns(
         index_daily_returns)
 
-    cumulative_comparison_fig = px.line(create_comparison_df(
-        portfolio_cumulative_returns, benchmark_cumulative_returns))
-    cumulative_comparison_fig.update_layout(
-        title='Portfolio Cumulative Returns v/s Benchmark Cumulative Returns')
-
-    cumulative_comparison_graph = dcc.Graph(
-        id='cumulative-returns-time-series-fig',
-        figure=cumulative_comparison_fig
-    )
+    cumulative_comparison_df = create_comparison_df(
+        portfolio_cumulative_returns, benchmark_cumulative_returns)
 
     ########################### Get metrics and graphs for Diversification Analysis ###########################
+    covariance = moments.covariance
     portfolio_variance = calculate_portfolio_variance(
-        historical_returns, optimal_weights)
+        historical_returns, optimal_weights, covariance)
     diversification_ratio = calculate_diversification_ratio(
-        historical_returns, optimal_weights)
+        historical_returns, optimal_weights, covariance)
     effective_number_of_assets = calculate_effective_number_of_assets(
         optimal_weights)
     diversification_metrics = [
@@ -197,9 +343,220 @@ def update_weights_table(value):
         html.Tbody(diversification_metrics_row)
     ])
 
-    return weights_table, risk_metrics_table, daily_comparison_graph, cumulative_comparison_graph, diversification_metrics_table
+    # The full-resolution return series are kept so that figures can be
+    # downsampled for any viewport and zoom range.
+    return {
+        'weights': weights_table,
+        'risk-metrics': risk_metrics_table,
+        'portfolio-returns-time-series': daily_comparison_df,
+        'cumulative-returns-time-series': cumulative_comparison_df,
+        'diversification-metrics': diversification_metrics_table,
+    }
+
+
+@app.callback(
+    Output('weights', 'children'),
+    [Input('opt-dropdown', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.update_weights_table')
+def update_weights_table(value, _):
+    return portfolio_analysis(value)['weights']
+
+
+@app.callback(
+    Output('risk-metrics', 'children'),
+    [Input('opt-dropdown', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.update_risk_metrics')
+def update_risk_metrics(value, _):
+    return portfolio_analysis(value)['risk-metrics']
+
+
+def comparison_figure(value, section, title, relayout_data, viewport_width):
+    """
+    Build a downsampled return comparison figure for the visible x range.
+
+    The number of points follows the viewport width, and after a zoom only the
+    selected range is downsampled, so detail is refined as the user zooms in.
+    Figures of the full range are cached per viewport width bucket.
+    """
+    x_range = relayout_x_range(relayout_data)
+    max_points = max(200, int(viewport_width or 1200) // 200 * 200)
+
+    def build():
+        frame = downsample_frame(portfolio_analysis(value)[section], max_points,
+                                 downsampling_method, x_range)
+        fig = px.line(frame)
+        fig.update_layout(title=title, uirevision=value)
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
+        return fig.to_dict()
+
+    if x_range is not None:
+        return build()
+    return analysis_cache.get_or_compute(
+        analysis_key('figure', value, section, max_points, downsampling_method), build)
+
+
+@app.callback(
+    Output('portfolio-returns-time-series-fig', 'figure'),
+    [Input('opt-dropdown', 'value'),
+     Input('portfolio-returns-time-series-fig', 'relayoutData'),
+     Input('viewport-width', 'data'), Input('universe-version', 'data')]
+)
+@timed('callback.update_daily_returns_graph')
+def update_daily_returns_graph(value, relayout_data, viewport_width, _):
+    return comparison_figure(value, 'portfolio-returns-time-series',
+                             'Portfolio Returns v/s Benchmark Returns',
+                             relayout_data, viewport_width)
+
+
+@app.callback(
+    Output('cumulative-returns-time-series-fig', 'figure'),
+    [Input('opt-dropdown', 'value'),
+     Input('cumulative-returns-time-series-fig', 'relayoutData'),
+     Input('viewport-width', 'data'), Input('universe-version', 'data')]
+)
+@timed('callback.update_cumulative_returns_graph')
+def update_cumulative_returns_graph(value, relayout_data, viewport_width, _):
+    return comparison_figure(value, 'cumulative-returns-time-series',
+                             'Portfolio Cumulative Returns v/s Benchmark Cumulative Returns',
+                             relayout_data, viewport_width)
+
+
+@app.callback(
+    Output('simulation-metrics', 'children'),
+    [Input('opt-dropdown', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.update_simulation_metrics')
+def update_simulation_metrics(value, _):
+    def compute():
+        historical_returns, optimal_weights = consistent_get(
+            returns_matrix_node, optimal_weights_nodes[value])
+        simulation_metrics = simulate_portfolio_risk(
+            historical_returns, optimal_weights, num_paths=simulation_paths)
+        return html.Table([
+            html.Thead(
+                html.Tr([html.Th("Metric"), html.Th("Values")])
+            ),
+            html.Tbody([html.Tr([html.Td(metric), html.Td(round(metric_value, 4))])
+                        for metric, metric_value in simulation_metrics.items()])
+        ])
+    return analysis_cache.get_or_compute(analysis_key('simulation', value, simulation_paths), compute)
+
+
+@app.callback(
+    Output('diversification-metrics', 'children'),
+    [Input('opt-dropdown', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.update_diversification_metrics')
+def update_diversification_metrics(value, _):
+    return portfolio_analysis(value)['diversification-metrics']
+
+
+@app.callback(
+    Output('rolling-risk-time-series', 'figure'),
+    [Input('opt-dropdown', 'value'), Input('rolling-window', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.update_rolling_risk')
+def update_rolling_risk(value, window, _):
+    def compute():
+        historical_returns, optimal_weights = consistent_get(
+            returns_matrix_node, optimal_weights_nodes[value])
+        portfolio_daily_returns, index_daily_returns = historical_returns.aligned_portfolio(
+            optimal_weights)
+        rolling_metrics = calculate_rolling_metrics(
+            portfolio_daily_returns, index_daily_returns, window, risk_free_rate)
+        return plot_rolling_metrics(rolling_metrics).to_dict()
+    return analysis_cache.get_or_compute(analysis_key('rolling-risk', value, window), compute)
+
+
+# Live session of the current universe, shared by all clients of this process,
+# with the returns matrix it was built from.
+live_sessions = {}
+live_lock = threading.Lock()
+
+
+def live_session(historical_returns):
+    """ Return the live session of a returns matrix, starting its feed on first use. """
+    with live_lock:
+        if live_sessions.get('returns') is not historical_returns:
+            symbols = list(historical_returns.columns)
+            returns = historical_returns.frame.assign(
+                **{market_index_symbol: historical_returns.benchmark_series})
+            feed = feed_from_env(symbols + [market_index_symbol], returns, live_interval)
+            live_sessions['returns'] = historical_returns
+            live_sessions['session'] = LiveSession(feed, symbols, market_index_symbol,
+                                                   risk_free_rate, live_max_points)
+        return live_sessions['session']
+
+
+@app.callback(
+    [Output('live-interval', 'disabled'), Output('live-charts', 'style'),
+     Output('live-cursor', 'data'), Output('live-returns', 'figure'),
+     Output('live-cumulative-returns', 'figure'), Output('live-risk', 'figure')],
+    [Input('live-toggle', 'value'), Input('opt-dropdown', 'value'),
+     Input('rolling-window', 'value'), Input('universe-version', 'data')]
+)
+@timed('callback.start_live_stream')
+def start_live_stream(toggle, value, window, _):
+    """ Reset the live charts and stream the selected portfolio from the next tick. """
+    if not live_mode or 'on' not in (toggle or []):
+        return (True, {'display': 'none'}, None) + (dash.no_update,) * 3
+    historical_returns, optimal_weights = consistent_get(
+        returns_matrix_node, optimal_weights_nodes[value])
+    cursor = live_session(historical_returns).track((value, window), optimal_weights, window)
+    return (False, {}, cursor) + live_figures()
+
+
+@app.callback(
+    [Output('live-returns', 'extendData'), Output('live-cumulative-returns', 'extendData'),
+     Output('live-risk', 'extendData'), Output('live-metrics', 'children'),
+     Output('live-cursor', 'data', allow_duplicate=True)],
+    [Input('live-interval', 'n_intervals')],
+    [State('live-cursor', 'data'), State('opt-dropdown', 'value'), State('rolling-window', 'value')],
+    prevent_initial_call=True
+)
+@timed('callback.stream_live_points')
+def stream_live_points(_, cursor, value, window):
+    """ Send only the points after the client's cursor, appended with extendData. """
+    session = live_session(returns_matrix_node.get())
+    if cursor is None or (value, window) not in session.portfolios:
+        return (dash.no_update,) * 5
+    session.advance()
+    points, cursor = session.points_since((value, window), cursor)
+    if not points:
+        return (dash.no_update,) * 5
+    live_metrics = html.Table([
+        html.Thead(html.Tr([html.Th("Metric"), html.Th("Values")])),
+        html.Tbody([html.Tr([html.Td(metric), html.Td(round(metric_value, 4))])
+                    for metric, metric_value in session.metrics((value, window)).items()])
+    ])
+    return live_extend_data(points, live_max_points) + (live_metrics, cursor)
+
+
+if debug_panel:
+    @app.callback(
+        Output('debug-panel', 'children'),
+        [Input('debug-panel-interval', 'n_intervals')]
+    )
+    def update_debug_panel(_):
+        rows = [html.Tr([html.Td(row['name']), html.Td(row['calls']),
+                         html.Td(round(row['total (s)'], 3)), html.Td(round(row['mean (ms)'], 1))])
+                for row in metrics.summary()]
+        return [html.Div(f'Analysis cache hit rate: {analysis_cache.hit_rate:.0%} '
+                         f'({len(analysis_cache)} entries)'),
+                html.Table([
+                    html.Thead(html.Tr([html.Th('Function'), html.Th('Calls'),
+                                        html.Th('Total (s)'), html.Th('Mean (ms)')])),
+                    html.Tbody(rows)
+                ])]
 
 
 # Run the Dash app
 if __name__ == '__main__':
+    # Compute the data and optimizations in the background while the server
+    # starts; with the debug reloader only the serving child process warms up.
+    if os.environ.get('PORTFOLIO_WARM_ON_START', '1') == '1' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_in_background()
     app.run_server(debug=True)
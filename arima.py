@@ -1,8 +1,15 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import os
+import warnings
 import pandas as pd
 import numpy as np
 import yfinance as yf
+from matplotlib.figure import Figure
 from statsmodels.tsa.stattools import adfuller
-from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.arima.model import ARIMA, ARIMAResults
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import matplotlib.pyplot as plt
 
@@ -13,22 +20,23 @@ def fetch_stock_data(symbol, start_date, end_date):
     return data['Close']
 
 
-def test_stationarity(series):
+def test_stationarity(series, verbose=True):
     # Perform Augmented Dickey-Fuller test
     # dropna is important as adfuller does not handle missing values
     result = adfuller(series.dropna())
-    print(f'ADF Statistic for {series.name}: {result[0]}')
-    print(f'p-value for {series.name}: {result[1]}')
+    if verbose:
+        print(f'ADF Statistic for {series.name}: {result[0]}')
+        print(f'p-value for {series.name}: {result[1]}')
     return result[1]
 
 
-def find_optimal_d(series):
+def find_optimal_d(series, verbose=True):
     d = 0
-    p_value = test_stationarity(series)
+    p_value = test_stationarity(series, verbose)
     while p_value > 0.05:
         d += 1
         series = series.diff().dropna()
-        p_value = test_stationarity(series)
+        p_value = test_stationarity(series, verbose)
     return d
 
 
@@ -79,9 +87,320 @@ def fit_predict_arima(stock_symbols, start_date, end_date, forecast_date):
     return forecasts
 
 
+def _fit_arima(series, order, previous=None):
+    """ Fit an ARIMA model, warm-started from a neighbouring fit's parameters. """
+    model = ARIMA(series, order=order)
+    start_params = None
+    if previous is not None:
+        # Parameters shared with the neighbouring order start from its
+        # estimates; new AR/MA coefficients start at zero.
+        known = dict(zip(previous.model.param_names, previous.params))
+        start_params = [known.get(name, 0.0) for name in model.param_names]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return model.fit(start_params=start_params)
+
+
+def select_arima_order(series, d, max_p=3, max_q=3, criterion='aic'):
+    """
+    Select the ARIMA (p, d, q) order by information criterion over a bounded grid.
+
+    Orders are visited by increasing p and, for each p, by increasing q. Each
+    fit is warm-started from the previous order's parameters. Orders whose fit
+    fails are skipped. Increasing q stops as soon as the criterion gets worse,
+    and increasing p stops once a whole row fails to improve on the best model
+    so far.
+
+    :param series: Series of prices.
+    :param d: Order of differencing.
+    :param max_p: Largest autoregressive order to try.
+    :param max_q: Largest moving-average order to try.
+    :param criterion: 'aic' or 'bic'.
+    :return: The best fitted ARIMA results.
+    :raises ValueError: If no order in the grid could be fitted.
+    """
+    best = None
+    row_start = None
+    for p in range(max_p + 1):
+        row_best = None
+        previous = row_start
+        for q in range(max_q + 1):
+            try:
+                fit = _fit_arima(series, (p, d, q), previous)
+            except (ValueError, np.linalg.LinAlgError):
+                continue
+            if row_best is not None and getattr(fit, criterion) >= getattr(row_best, criterion):
+                break
+            row_best = previous = fit
+            if q == 0:
+                row_start = fit
+        if row_best is None:
+            continue
+        if best is not None and getattr(row_best, criterion) >= getattr(best, criterion):
+            break
+        best = row_best
+    if best is None:
+        raise ValueError(f"No ARIMA order up to ({max_p}, {d}, {max_q}) could be fitted")
+    return best
+
+
+def plot_forecast(symbol, data, forecast, path):
+    """ Save the historical prices and the forecast as a PNG, without a display. """
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(data.index, data, label='Historical Close Prices')
+    ax.plot(forecast.index, forecast.values,
+            label='Forecasted Close Prices', color='red')
+    ax.set_title(f'Stock Price Forecast for {symbol}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Price')
+    ax.legend()
+    ax.grid(True)
+    fig.savefig(path)
+
+
+def forecast_key(data, end_date, forecast_date, max_p, max_q, criterion):
+    """ Identify the data and settings a saved forecast was produced from. """
+    return {'start': str(data.index[0].date()), 'end': end_date,
+            'forecast_date': forecast_date, 'observations': len(data),
+            'max_p': max_p, 'max_q': max_q, 'criterion': criterion}
+
+
+def load_cached_forecast(output_dir, symbol, key):
+    """ Return the saved forecast for a symbol if it matches ``key``, else None. """
+    symbol_dir = os.path.join(output_dir, symbol)
+    meta_path = os.path.join(symbol_dir, 'meta.json')
+    forecast_path = os.path.join(symbol_dir, 'forecast.csv')
+    if not (os.path.exists(meta_path) and os.path.exists(forecast_path)):
+        return None
+    with open(meta_path) as f:
+        if json.load(f).get('key') != key:
+            return None
+    return pd.read_csv(forecast_path, index_col=0, parse_dates=True).iloc[:, 0]
+
+
+def forecast_symbol(symbol, data, end_date, forecast_date, output_dir, max_p=3,
+                    max_q=3, criterion='aic', plot=True):
+    """
+    Fit and forecast one symbol, reusing the saved model and forecast when
+    they were produced from the same data and settings.
+
+    :return: The forecast as a Series indexed by date.
+    """
+    key = forecast_key(data, end_date, forecast_date, max_p, max_q, criterion)
+    cached = load_cached_forecast(output_dir, symbol, key)
+    if cached is not None:
+        return cached
+
+    # Fit on a plain integer index: the trading-day index has no frequency.
+    dates = data.index
+    data = data.reset_index(drop=True)
+    d = find_optimal_d(data, verbose=False)
+    model_fit = select_arima_order(data, d, max_p, max_q, criterion)
+    steps = (pd.to_datetime(forecast_date) - pd.to_datetime(end_date)).days
+    forecast = pd.Series(np.asarray(model_fit.forecast(steps=steps)), index=pd.date_range(
+        start=end_date, periods=steps + 1, freq='D')[1:], name=symbol)
+
+    symbol_dir = os.path.join(output_dir, symbol)
+    os.makedirs(symbol_dir, exist_ok=True)
+    model_fit.save(os.path.join(symbol_dir, 'model.pkl'))
+    forecast.to_csv(os.path.join(symbol_dir, 'forecast.csv'))
+    with open(os.path.join(symbol_dir, 'meta.json'), 'w') as f:
+        json.dump({'key': key, 'order': list(model_fit.model.order),
+                   criterion: getattr(model_fit, criterion)}, f)
+    if plot:
+        plot_forecast(symbol, pd.Series(data.values, index=dates), forecast, os.path.join(symbol_dir, 'forecast.png'))
+    return forecast
+
+
+def batch_forecast(stock_symbols, start_date, end_date, forecast_date,
+                   output_dir='forecasts', processes=None, max_p=3, max_q=3,
+                   criterion='aic', plot=True):
+    """
+    Forecast many symbols without user interaction, in parallel.
+
+    Prices come from the shared local price store, each symbol's order is
+    chosen by select_arima_order in a worker process, and fitted models,
+    forecasts and plots are written under ``output_dir/<symbol>/`` so that
+    unchanged symbols are not refit on the next run.
+
+    :return: A dictionary with symbols as keys and forecast Series as values.
+    """
+    from features.data_retrieval import retrieve_historical_data
+    prices = retrieve_historical_data(stock_symbols, start_date, end_date)
+    forecasts = {}
+    args = []
+    for symbol in stock_symbols:
+        if symbol not in prices:
+            continue
+        data = prices[symbol]['Close']
+        key = forecast_key(data, end_date, forecast_date, max_p, max_q, criterion)
+        cached = load_cached_forecast(output_dir, symbol, key)
+        if cached is not None:
+            forecasts[symbol] = cached
+        else:
+            args.append((symbol, data, end_date, forecast_date, output_dir,
+                         max_p, max_q, criterion, plot))
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(args) <= 1:
+        results = [forecast_symbol(*symbol_args) for symbol_args in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(args))) as executor:
+            results = list(executor.map(forecast_symbol, *zip(*args)))
+    forecasts.update(zip([symbol_args[0] for symbol_args in args], results))
+    return {symbol: forecasts[symbol] for symbol in stock_symbols if symbol in forecasts}
+
+
+class ForecastService:
+    """
+    Persistent per-symbol ARIMA models that are kept current as new bars arrive.
+
+    New observations are run through the Kalman filter of the saved model
+    with its estimated parameters (``ARIMAResults.extend``), which costs
+    O(new bars) and involves no re-estimation. A full order search and
+    re-estimation over the stored history only runs every ``refit_every``
+    new observations, or when the standardized one-step forecast error of a
+    new bar exceeds ``drift_threshold`` and the model is flagged as drifting.
+
+    State lives in ``state_dir/<symbol>/``: the current results (model.pkl),
+    the price history used for re-estimation (history.pkl) and meta.json.
+    """
+
+    def __init__(self, state_dir='forecast_state', max_p=3, max_q=3, criterion='aic',
+                 refit_every=20, drift_threshold=4.0):
+        self.state_dir = state_dir
+        self.max_p = max_p
+        self.max_q = max_q
+        self.criterion = criterion
+        self.refit_every = refit_every
+        self.drift_threshold = drift_threshold
+
+    def _path(self, symbol, name):
+        return os.path.join(self.state_dir, symbol, name)
+
+    def _load(self, symbol):
+        if not os.path.exists(self._path(symbol, 'meta.json')):
+            return None, None, None
+        with open(self._path(symbol, 'meta.json')) as f:
+            meta = json.load(f)
+        results = ARIMAResults.load(self._path(symbol, 'model.pkl'))
+        history = pd.read_pickle(self._path(symbol, 'history.pkl'))
+        return meta, results, history
+
+    def _save(self, symbol, meta, results, history):
+        os.makedirs(os.path.join(self.state_dir, symbol), exist_ok=True)
+        results.save(self._path(symbol, 'model.pkl'))
+        history.to_pickle(self._path(symbol, 'history.pkl'))
+        with open(self._path(symbol, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def fit(self, symbol, history):
+        """ Fully (re-)estimate the model of a symbol on its price history. """
+        values = history.reset_index(drop=True)
+        d = find_optimal_d(values, verbose=False)
+        results = select_arima_order(values, d, self.max_p, self.max_q, self.criterion)
+        meta = {'order': list(results.model.order), 'last_date': str(history.index[-1].date()),
+                'observations_since_fit': 0}
+        self._save(symbol, meta, results, history)
+        return 'fit'
+
+    def update(self, symbol, prices):
+        """
+        Bring the model of a symbol up to date with ``prices``.
+
+        Only the bars after the last date already seen are used. The model is
+        fit from scratch when there is no saved state, re-estimated when a
+        refit is due or drift is detected, and otherwise extended by filtering.
+
+        :param prices: Series of closing prices indexed by date.
+        :return: 'fit', 'refit', 'extended' or 'unchanged'.
+        """
+        meta, results, history = self._load(symbol)
+        if meta is None:
+            return self.fit(symbol, prices)
+        new = prices[prices.index > pd.Timestamp(meta['last_date'])]
+        if new.empty:
+            return 'unchanged'
+        history = pd.concat([history, new])
+        if meta['observations_since_fit'] + len(new) >= self.refit_every:
+            self.fit(symbol, history)
+            return 'refit'
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            extended = results.extend(np.asarray(new, dtype=float))
+        errors = np.abs(extended.standardized_forecasts_error[0])
+        if np.nanmax(errors) > self.drift_threshold:
+            self.fit(symbol, history)
+            return 'refit'
+        meta['last_date'] = str(new.index[-1].date())
+        meta['observations_since_fit'] += len(new)
+        self._save(symbol, meta, extended, history)
+        return 'extended'
+
+    def forecast(self, symbol, steps):
+        """ Forecast the next ``steps`` values from the current state of a symbol. """
+        _, results, _ = self._load(symbol)
+        return np.asarray(results.forecast(steps=steps))
+
+    def refresh(self, prices, steps=1):
+        """
+        Update every symbol with its latest prices and forecast ahead.
+
+        :param prices: Dictionary of symbol to Series of closing prices.
+        :param steps: Number of steps to forecast.
+        :return: A tuple of a dictionary of forecasts and a dictionary of the
+            action taken for each symbol.
+        """
+        actions = {symbol: self.update(symbol, series) for symbol, series in prices.items()}
+        forecasts = {symbol: self.forecast(symbol, steps) for symbol in prices}
+        return forecasts, actions
+
+
 stock_symbols = ['SBIN.NS', 'HDFCBANK.NS', 'ICICIBANK.NS', 'AXISBANK.NS',
                  'KOTAKBANK.NS', 'INDUSINDBK.NS', 'PNB.NS', 'BANKBARODA.NS',
                  'FEDERALBNK.NS', 'YESBANK.NS']
-forecasts = fit_predict_arima(
-    stock_symbols, '2023-04-15', '2024-04-15', '2024-04-30')
-print(forecasts)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ARIMA stock price forecasts.')
+    parser.add_argument('--batch', action='store_true',
+                        help='Forecast headlessly in parallel with order search.')
+    parser.add_argument('--symbols', nargs='+', default=stock_symbols)
+    parser.add_argument('--start-date', default='2023-04-15')
+    parser.add_argument('--end-date', default=None,
+                        help='Last date of the data; defaults to today with --update, '
+                             'otherwise to 2024-04-15.')
+    parser.add_argument('--forecast-date', default='2024-04-30')
+    parser.add_argument('--output-dir', default='forecasts')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-p', type=int, default=3)
+    parser.add_argument('--max-q', type=int, default=3)
+    parser.add_argument('--criterion', choices=['aic', 'bic'], default='aic')
+    parser.add_argument('--no-plots', action='store_true')
+    parser.add_argument('--update', action='store_true',
+                        help='Extend the saved models with the bars since the last run.')
+    parser.add_argument('--state-dir', default='forecast_state')
+    parser.add_argument('--steps', type=int, default=10)
+    args = parser.parse_args()
+    if args.end_date is None:
+        # Updates must see the bars since the last run, up to today.
+        args.end_date = (datetime.now().strftime('%Y-%m-%d') if args.update
+                         else '2024-04-15')
+
+    if args.update:
+        from features.data_retrieval import retrieve_historical_data
+        prices = retrieve_historical_data(args.symbols, args.start_date, args.end_date)
+        service = ForecastService(args.state_dir, args.max_p, args.max_q, args.criterion)
+        forecasts, actions = service.refresh(
+            {symbol: data['Close'] for symbol, data in prices.items()}, args.steps)
+        print(actions)
+    elif args.batch:
+        forecasts = batch_forecast(args.symbols, args.start_date, args.end_date,
+                                   args.forecast_date, args.output_dir, args.processes,
+                                   args.max_p, args.max_q, args.criterion,
+                                   not args.no_plots)
+    else:
+        forecasts = fit_predict_arima(
+            args.symbols, args.start_date, args.end_date, args.forecast_date)
+    print(forecasts)
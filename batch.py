@@ -0,0 +1,261 @@
+"""
+Compute portfolio analytics for many universes headlessly, in parallel.
+
+The manifest is a JSON file listing the portfolios to analyze; keys missing
+from an entry are taken from ``defaults``, then from the dashboard settings:
+
+    {
+      "defaults": {"start_date": "2020-01-01", "end_date": "2024-12-31",
+                   "methods": ["mev", "miv", "mad", "hrp"], "covariance": "sample",
+                   "benchmark": "^NSEI", "risk_free_rate": 0.02},
+      "portfolios": [
+        {"name": "banks", "symbols": ["SBIN.NS", "HDFCBANK.NS", "ICICIBANK.NS"]},
+        {"name": "it", "symbols": ["TCS.NS", "INFY.NS"], "start_date": "2022-01-01"}
+      ]
+    }
+
+Methods are 'mev' (mean variance), 'miv' (minimum variance), 'mad' (maximum
+diversification) and 'hrp' (hierarchical risk parity). Run from the
+repository root:
+
+    python batch.py manifest.json --output-dir batch_output --processes 4 --report
+
+Prices of every symbol are synced once into the local price store before the
+portfolios are dispatched to a process pool, so the workers read the cached
+prices instead of downloading them again. The weights, the risk, return and
+diversification metrics, and the cumulative returns are written as Parquet
+files to the output directory, with an optional static HTML report.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+import pandas as pd
+import plotly.express as px
+from features.covariance import default_covariance_method
+from features.data_retrieval import (create_historical_returns_dataframe, market_index_symbol,
+                                     retrieve_historical_data, retrieve_market_index_returns)
+from features.diversification_analysis import (calculate_diversification_ratio,
+                                               calculate_effective_number_of_assets,
+                                               calculate_portfolio_variance)
+from features.downsampling import downsample_frame
+from features.portfolio_construction import (calculate_portfolio_metrics,
+                                             hierarchical_risk_parity_portfolio,
+                                             maximum_diversification_portfolio,
+                                             mean_variance_optimization,
+                                             minimum_variance_portfolio)
+from features.price_store import PriceStore
+from features.return_analysis import calculate_cumulative_returns
+from features.returns_matrix import ReturnsMatrix
+from features.risk_analysis import calculate_risk_metrics_batch
+
+METHODS = {
+    'mev': mean_variance_optimization,
+    'miv': minimum_variance_portfolio,
+    'mad': maximum_diversification_portfolio,
+    'hrp': hierarchical_risk_parity_portfolio,
+}
+
+METHOD_LABELS = {'mev': 'Mean Variance', 'miv': 'Minimum Variance',
+                 'mad': 'Maximum Diversification', 'hrp': 'Hierarchical Risk Parity'}
+
+
+def load_manifest(path):
+    """
+    Read a manifest and fill every portfolio entry with the defaults.
+
+    :param path: Path of the JSON manifest.
+    :return: A list of portfolio entries with all keys set.
+    :raises ValueError: When an entry has no name or symbols, a name is
+        repeated, or a method is unknown.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    defaults = {'start_date': '2020-01-01', 'end_date': pd.Timestamp.now().strftime('%Y-%m-%d'),
+                'methods': list(METHODS), 'covariance': default_covariance_method,
+                'benchmark': market_index_symbol, 'risk_free_rate': 0.02}
+    defaults.update(manifest.get('defaults', {}))
+    entries, names = [], set()
+    for entry in manifest['portfolios']:
+        entry = {**defaults, **entry}
+        if not entry.get('name') or not entry.get('symbols'):
+            raise ValueError(f"Every portfolio needs a name and symbols: {entry}")
+        if entry['name'] in names:
+            raise ValueError(f"Duplicate portfolio name: {entry['name']}")
+        unknown = set(entry['methods']) - set(METHODS)
+        if unknown:
+            raise ValueError(f"Unknown methods for {entry['name']}: {sorted(unknown)}")
+        names.add(entry['name'])
+        entries.append(entry)
+    return entries
+
+
+def prefetch_prices(entries, store):
+    """
+    Sync every symbol of the manifest into the price store once, over the
+    union of the date ranges of the portfolios that hold it.
+    """
+    ranges = {}
+    for entry in entries:
+        for symbol in list(entry['symbols']) + [entry['benchmark']]:
+            start, end = ranges.get(symbol, (entry['start_date'], entry['end_date']))
+            ranges[symbol] = (min(start, entry['start_date']), max(end, entry['end_date']))
+    groups = {}
+    for symbol, date_range in ranges.items():
+        groups.setdefault(date_range, []).append(symbol)
+    for (start, end), symbols in groups.items():
+        retrieve_historical_data(symbols, start, end, store=store)
+
+
+def analyze_portfolio(entry, cache_dir):
+    """
+    Run the construction, risk, return and diversification analyses of one
+    manifest entry for each of its methods.
+
+    :param entry: Portfolio entry of the manifest, with all keys set.
+    :param cache_dir: Directory of the shared price store.
+    :return: A tuple of DataFrames: weights, metrics and cumulative returns.
+    """
+    store = PriceStore(cache_dir)
+    name, start, end = entry['name'], entry['start_date'], entry['end_date']
+    data = retrieve_historical_data(entry['symbols'], start, end, store=store)
+    returns = create_historical_returns_dataframe(data)
+    if returns.empty:
+        raise ValueError(f"No returns for {name} between {start} and {end}")
+    market_returns = retrieve_market_index_returns(entry['benchmark'], start, end, store=store)
+    matrix = ReturnsMatrix.from_frame(returns, market_returns)
+    covariance = matrix.covariance_estimate(entry['covariance'])
+
+    weights_rows, metrics_rows, cumulative = [], [], []
+    for method in entry['methods']:
+        weights = METHODS[method](matrix, covariance=entry['covariance'])
+        weights_rows += [{'portfolio': name, 'method': method, 'symbol': symbol,
+                          'weight': weight} for symbol, weight in zip(matrix.columns, weights)]
+
+        portfolio_returns, benchmark_returns = matrix.aligned_portfolio(weights)
+        portfolio_cumulative = calculate_cumulative_returns(portfolio_returns)
+        benchmark_cumulative = calculate_cumulative_returns(benchmark_returns)
+        annual_return, annual_volatility, annual_sharpe = calculate_portfolio_metrics(matrix, weights)
+        risk_metrics = calculate_risk_metrics_batch(
+            matrix, weights, None, entry['risk_free_rate']).iloc[0]
+        metrics_rows.append({
+            'portfolio': name, 'method': method, 'start_date': start, 'end_date': end,
+            'observations': len(matrix),
+            'Annual Return': annual_return,
+            'Annual Volatility': annual_volatility,
+            'Annual Sharpe Ratio': annual_sharpe,
+            **risk_metrics.to_dict(),
+            'Cumulative Return': portfolio_cumulative.iloc[-1] - 1,
+            'Benchmark Cumulative Return': benchmark_cumulative.iloc[-1] - 1,
+            'Portfolio Variance': calculate_portfolio_variance(matrix, weights, covariance),
+            'Diversification Ratio': calculate_diversification_ratio(matrix, weights, covariance),
+            'Effective Number of Assets': calculate_effective_number_of_assets(weights),
+        })
+        cumulative.append(pd.DataFrame({
+            'portfolio': name, 'method': method, 'date': portfolio_cumulative.index,
+            'portfolio_cumulative': portfolio_cumulative.values,
+            'benchmark_cumulative': benchmark_cumulative.values}))
+
+    return pd.DataFrame(weights_rows), pd.DataFrame(metrics_rows), pd.concat(cumulative)
+
+
+def run_manifest(entries, cache_dir, processes=None):
+    """
+    Analyze every portfolio of a manifest, in parallel.
+
+    A portfolio that fails is reported and left out of the results; the
+    others are still analyzed.
+
+    :param entries: Portfolio entries, see load_manifest.
+    :param cache_dir: Directory of the shared price store.
+    :param processes: Number of worker processes, defaults to the CPU count.
+    :return: A tuple of the weights, metrics and cumulative returns
+        DataFrames, and a dictionary of portfolio name to error message.
+    """
+    prefetch_prices(entries, PriceStore(cache_dir))
+    processes = processes or os.cpu_count() or 1
+    results, errors = [], {}
+    if processes == 1 or len(entries) <= 1:
+        for entry in entries:
+            try:
+                results.append(analyze_portfolio(entry, cache_dir))
+            except Exception as e:
+                errors[entry['name']] = str(e)
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(entries))) as executor:
+            futures = [executor.submit(analyze_portfolio, entry, cache_dir) for entry in entries]
+            for entry, future in zip(entries, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors[entry['name']] = str(e)
+    for name, error in errors.items():
+        print(f"Error analyzing portfolio {name}: {error}")
+    if not results:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), errors
+    weights, metrics, cumulative = (pd.concat(frames, ignore_index=True)
+                                    for frames in zip(*results))
+    return weights, metrics, cumulative, errors
+
+
+def write_report(path, weights, metrics, cumulative, max_points=1000):
+    """
+    Write a static HTML report with the metrics, weights and cumulative
+    returns of every portfolio. The return series are downsampled to about
+    ``max_points`` points per line to keep the file small.
+    """
+    sections = []
+    for name, portfolio_metrics in metrics.groupby('portfolio', sort=False):
+        table = portfolio_metrics.drop(columns=['portfolio', 'start_date', 'end_date']) \
+            .set_index('method').rename(index=METHOD_LABELS).T
+        portfolio_weights = weights[weights['portfolio'] == name].pivot(
+            index='symbol', columns='method', values='weight').rename(columns=METHOD_LABELS)
+        series = cumulative[cumulative['portfolio'] == name]
+        lines = series.pivot(index='date', columns='method', values='portfolio_cumulative') \
+            .rename(columns=METHOD_LABELS)
+        lines['Benchmark'] = series.groupby('date')['benchmark_cumulative'].first()
+        fig = px.line(downsample_frame(lines, max_points))
+        fig.update_layout(title=f'{name}: Cumulative Returns', yaxis_title='Growth of 1')
+        start, end = portfolio_metrics[['start_date', 'end_date']].iloc[0]
+        sections.append(
+            f'<h2>{name}</h2><p>{start} to {end}</p>'
+            f'<h3>Metrics</h3>{table.to_html(float_format="%.4f", classes="table table-sm")}'
+            f'<h3>Weights</h3>{portfolio_weights.to_html(float_format="%.4f", classes="table table-sm")}'
+            + fig.to_html(full_html=False, include_plotlyjs='cdn' if not sections else False))
+    with open(path, 'w') as f:
+        f.write('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Portfolio Report</title>'
+                '<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css">'
+                '</head><body class="p-3"><h1>Portfolio Report</h1>'
+                + ''.join(sections) + '</body></html>')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help='JSON manifest of the portfolios to analyze.')
+    parser.add_argument('--output-dir', default='batch_output')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--cache-dir', default=os.environ.get('PORTFOLIO_CACHE_DIR', '.price_cache'),
+                        help='Directory of the shared price store.')
+    parser.add_argument('--report', action='store_true',
+                        help='Also write a static HTML report, report.html.')
+    args = parser.parse_args()
+
+    entries = load_manifest(args.manifest)
+    weights, metrics, cumulative, errors = run_manifest(entries, args.cache_dir, args.processes)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not metrics.empty:
+        weights.to_parquet(os.path.join(args.output_dir, 'weights.parquet'), index=False)
+        metrics.to_parquet(os.path.join(args.output_dir, 'metrics.parquet'), index=False)
+        cumulative.to_parquet(os.path.join(args.output_dir, 'cumulative_returns.parquet'),
+                              index=False)
+        if args.report:
+            write_report(os.path.join(args.output_dir, 'report.html'), weights, metrics, cumulative)
+    print(f"Analyzed {len(entries) - len(errors)} of {len(entries)} portfolios "
+          f"into {args.output_dir}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Compare the precomputed-moment optimizers with the original SLSQP pattern.
+
+Run from the repository root with ``python -m benchmarks.bench_optimization``.
+"""
+import argparse
+import time
+import numpy as np
+from scipy.optimize import minimize
+from benchmarks.synthetic import generate_returns
+from features.portfolio_construction import calculate_portfolio_metrics, PortfolioProblem
+
+
+def legacy_minimum_variance(returns):
+    """ The original pattern: reduce the returns DataFrame on every evaluation. """
+    num_assets = len(returns.columns)
+    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
+    bounds = tuple((0, 1) for asset in range(num_assets))
+    initial_guess = num_assets * [1. / num_assets,]
+
+    def portfolio_volatility(weights, returns):
+        return calculate_portfolio_metrics(returns, weights)[1]
+
+    return minimize(portfolio_volatility, initial_guess, args=(returns,),
+                    method='SLSQP', bounds=bounds, constraints=constraints).x
+
+
+def legacy_maximum_diversification(returns):
+    num_assets = len(returns.columns)
+    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
+    bounds = tuple((0, 1) for asset in range(num_assets))
+    initial_guess = num_assets * [1. / num_assets,]
+
+    def diversification_ratio(weights, returns):
+        weighted_volatilities = np.dot(weights, returns.std() * np.sqrt(252))
+        portfolio_volatility = np.sqrt(
+            np.dot(weights.T, np.dot(returns.cov() * 252, weights)))
+        return -weighted_volatilities / portfolio_volatility
+
+    return minimize(diversification_ratio, initial_guess, args=(returns,),
+                    method='SLSQP', bounds=bounds, constraints=constraints).x
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--assets', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--skip-legacy-above', type=int, default=100,
+                        help='Skip the legacy optimizers above this many assets.')
+    args = parser.parse_args()
+
+    # Pay the one-off import and setup cost of the QP backend up front.
+    PortfolioProblem.from_returns(generate_returns(5, 50)).minimum_variance('qp')
+
+    print(f"{'assets':>6} {'objective':>10} {'legacy s':>10} {'slsqp s':>10} "
+          f"{'auto s':>10} {'speedup':>8} {'obj diff':>10}")
+    for num_assets in args.assets:
+        returns = generate_returns(num_assets, args.days)
+        cases = [
+            ('min var', legacy_minimum_variance, 'minimum_variance', 'volatility'),
+            ('max div', legacy_maximum_diversification, 'maximum_diversification',
+             'negative_diversification_ratio'),
+        ]
+        for label, legacy, method_name, objective_name in cases:
+            def solve(method):
+                problem = PortfolioProblem.from_returns(returns)
+                return getattr(problem, method_name)(method)
+
+            fast, fast_time = timed(solve, 'auto')
+            slsqp, slsqp_time = timed(solve, 'slsqp')
+            objective = getattr(PortfolioProblem.from_returns(returns), objective_name)
+            if num_assets <= args.skip_legacy_above:
+                slow, slow_time = timed(legacy, returns)
+                diff = objective(fast) - objective(slow)
+                print(f"{num_assets:>6} {label:>10} {slow_time:>10.4f} {slsqp_time:>10.4f} "
+                      f"{fast_time:>10.4f} {slow_time / fast_time:>7.1f}x {diff:>10.2e}")
+            else:
+                print(f"{num_assets:>6} {label:>10} {'-':>10} {slsqp_time:>10.4f} "
+                      f"{fast_time:>10.4f} {'-':>8} {'-':>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Benchmark the feature modules and the weights callback on synthetic markets.
+
+Every public function of data_retrieval, portfolio_construction,
+risk_analysis, return_analysis and diversification_analysis is timed on
+deterministic factor-model returns for each combination of ``--assets`` and
+``--years``, together with a daily rebalanced backtest and the
+``update_weights_table`` callback end to end (request, optimization, table
+building and JSON response).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite --assets 10 100 500 2000 --years 1 5 20 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+Results are written as JSON. With ``--baseline``, the fastest time of every
+case is compared with the baseline and the command exits with status 1 when
+any case is slower by more than ``--tolerance``.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_market, synthetic_prices
+
+CASES = []
+
+
+def case(module, name):
+    """ Register a benchmark case; the function takes a market and returns the callable to time. """
+    def decorator(setup):
+        CASES.append((f'{module}.{name}', setup))
+        return setup
+    return decorator
+
+
+class Market:
+    """ Synthetic returns and everything the cases derive from them. """
+
+    def __init__(self, num_assets, years, seed=0):
+        self.returns, self.market = generate_market(num_assets, years, seed=seed)
+        self.symbols = list(self.returns.columns)
+        self.weights = np.full(num_assets, 1. / num_assets)
+        self.portfolio = self.returns @ self.weights
+        self.prices = synthetic_prices(self.returns)
+        self.prices.update(synthetic_prices(self.market.rename('^INDEX')))
+        self.price_data = {symbol: self.prices[symbol].to_frame('Close') for symbol in self.symbols}
+        self.start_date = self.returns.index[0].strftime('%Y-%m-%d')
+        self.end_date = (self.returns.index[-1] + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        self._cache_root = tempfile.TemporaryDirectory()
+        self._cache_ids = itertools.count()
+
+    def price_store(self):
+        """ A price store with an empty cache in front of the synthetic prices. """
+        from features.price_providers import FixtureProvider
+        from features.price_store import PriceStore
+        cache_dir = os.path.join(self._cache_root.name, str(next(self._cache_ids)))
+        return PriceStore(cache_dir, FixtureProvider(prices=self.prices))
+
+
+########################### data_retrieval ###########################
+
+@case('data_retrieval', 'retrieve_historical_data[cold]')
+def bench_retrieve_cold(market):
+    from features.data_retrieval import retrieve_historical_data
+    return lambda: retrieve_historical_data(market.symbols, market.start_date,
+                                            market.end_date, store=market.price_store())
+
+
+@case('data_retrieval', 'retrieve_historical_data[cached]')
+def bench_retrieve_cached(market):
+    from features.data_retrieval import retrieve_historical_data
+    store = market.price_store()
+    retrieve_historical_data(market.symbols, market.start_date, market.end_date, store=store)
+    return lambda: retrieve_historical_data(market.symbols, market.start_date,
+                                            market.end_date, store=store)
+
+
+@case('data_retrieval', 'create_historical_returns_dataframe')
+def bench_create_returns(market):
+    from features.data_retrieval import create_historical_returns_dataframe
+    return lambda: create_historical_returns_dataframe(market.price_data)
+
+
+@case('data_retrieval', 'retrieve_market_index_returns')
+def bench_market_index(market):
+    from features.data_retrieval import retrieve_market_index_returns
+    store = market.price_store()
+    return lambda: retrieve_market_index_returns('^INDEX', market.start_date,
+                                                 market.end_date, store=store)
+
+
+########################### portfolio_construction ###########################
+
+@case('portfolio_construction', 'calculate_portfolio_metrics')
+def bench_portfolio_metrics(market):
+    from features.portfolio_construction import calculate_portfolio_metrics
+    return lambda: calculate_portfolio_metrics(market.returns, market.weights)
+
+
+@case('portfolio_construction', 'mean_variance_optimization')
+def bench_mean_variance(market):
+    from features.portfolio_construction import mean_variance_optimization
+    return lambda: mean_variance_optimization(market.returns)
+
+
+@case('portfolio_construction', 'minimum_variance_portfolio')
+def bench_minimum_variance(market):
+    from features.portfolio_construction import minimum_variance_portfolio
+    return lambda: minimum_variance_portfolio(market.returns)
+
+
+@case('portfolio_construction', 'maximum_diversification_portfolio')
+def bench_maximum_diversification(market):
+    from features.portfolio_construction import maximum_diversification_portfolio
+    return lambda: maximum_diversification_portfolio(market.returns)
+
+
+@case('portfolio_construction', 'hierarchical_risk_parity_portfolio')
+def bench_hierarchical_risk_parity(market):
+    from features.portfolio_construction import hierarchical_risk_parity_portfolio
+    return lambda: hierarchical_risk_parity_portfolio(market.returns)
+
+
+########################### risk_analysis ###########################
+
+@case('risk_analysis', 'calculate_portfolio_returns')
+def bench_portfolio_returns(market):
+    from features.risk_analysis import calculate_portfolio_returns
+    return lambda: calculate_portfolio_returns(market.returns, market.weights)
+
+
+@case('risk_analysis', 'calculate_standard_deviation')
+def bench_standard_deviation(market):
+    from features.risk_analysis import calculate_standard_deviation
+    return lambda: calculate_standard_deviation(market.portfolio)
+
+
+@case('risk_analysis', 'calculate_beta')
+def bench_beta(market):
+    from features.risk_analysis import calculate_beta
+    return lambda: calculate_beta(market.portfolio, market.market)
+
+
+@case('risk_analysis', 'calculate_sharpe_ratio')
+def bench_sharpe(market):
+    from features.risk_analysis import calculate_sharpe_ratio
+    return lambda: calculate_sharpe_ratio(market.portfolio, 0.02)
+
+
+@case('risk_analysis', 'calculate_sortino_ratio')
+def bench_sortino(market):
+    from features.risk_analysis import calculate_sortino_ratio
+    return lambda: calculate_sortino_ratio(market.portfolio, 0.02)
+
+
+@case('risk_analysis', 'calculate_treynor_ratio')
+def bench_treynor(market):
+    from features.risk_analysis import calculate_treynor_ratio
+    return lambda: calculate_treynor_ratio(market.portfolio, 1.0, 0.02)
+
+
+@case('risk_analysis', 'align_data')
+def bench_align(market):
+    from features.risk_analysis import align_data
+    return lambda: align_data(market.portfolio, market.market)
+
+
+@case('risk_analysis', 'calculate_risk_metrics_batch')
+def bench_risk_batch(market):
+    from features.risk_analysis import calculate_risk_metrics_batch
+    return lambda: calculate_risk_metrics_batch(market.returns, market.weights,
+                                                market.market, 0.02)
+
+
+########################### return_analysis ###########################
+
+@case('return_analysis', 'calculate_cumulative_returns')
+def bench_cumulative(market):
+    from features.return_analysis import calculate_cumulative_returns
+    return lambda: calculate_cumulative_returns(market.returns)
+
+
+@case('return_analysis', 'compare_with_benchmark')
+def bench_compare(market):
+    from features.return_analysis import compare_with_benchmark
+    return lambda: compare_with_benchmark(market.portfolio, market.market)
+
+
+########################### diversification_analysis ###########################
+
+@case('diversification_analysis', 'calculate_portfolio_variance')
+def bench_portfolio_variance(market):
+    from features.diversification_analysis import calculate_portfolio_variance
+    return lambda: calculate_portfolio_variance(market.returns, market.weights)
+
+
+@case('diversification_analysis', 'calculate_diversification_ratio')
+def bench_diversification_ratio(market):
+    from features.diversification_analysis import calculate_diversification_ratio
+    return lambda: calculate_diversification_ratio(market.returns, market.weights)
+
+
+@case('diversification_analysis', 'calculate_effective_number_of_assets')
+def bench_effective_number(market):
+    from features.diversification_analysis import calculate_effective_number_of_assets
+    return lambda: calculate_effective_number_of_assets(market.weights)
+
+
+@case('diversification_analysis', 'plot_correlation_heatmap')
+def bench_heatmap(market):
+    from features.diversification_analysis import plot_correlation_heatmap
+    return lambda: plot_correlation_heatmap(market.returns)
+
+
+########################### backtesting ###########################
+
+BACKTEST_MAX_ASSETS = 30
+BACKTEST_WINDOW = 126
+
+
+@case('backtesting', 'run_backtest[daily]')
+def bench_backtest_daily(market):
+    # Every strategy is re-solved on every day, so the universe is capped to
+    # keep the larger markets tractable, and the window is short enough to
+    # leave rebalances in a one-year market.
+    from features.backtesting import run_backtest
+    returns = market.returns.iloc[:, :BACKTEST_MAX_ASSETS]
+    return lambda: run_backtest(returns, window=BACKTEST_WINDOW, rebalance='daily')
+
+
+########################### callbacks ###########################
+
+@case('app', 'update_weights_table')
+def bench_update_weights_table(market):
+    """
+    The weights callback through the Dash request handler. The synthetic data
+    is injected into the compute graph with Node.set, which bumps the data
+    version, so every run recomputes the weights and the table as after a
+    data refresh.
+    """
+    import app
+    from features.data_retrieval import historical_returns_node, market_index_returns_node
+    app.stock_symbols[:] = market.symbols
+    client = app.app.server.test_client()
+    body = {'output': 'weights.children',
+            'outputs': {'id': 'weights', 'property': 'children'},
+            'inputs': [{'id': 'opt-dropdown', 'property': 'value', 'value': 'mev'},
+                       {'id': 'universe-version', 'property': 'data', 'value': 0}],
+            'changedPropIds': ['opt-dropdown.value']}
+
+    def run():
+        historical_returns_node.set(market.returns)
+        market_index_returns_node.set(market.market)
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f'update_weights_table failed with status {response.status_code}')
+    return run
+
+
+def measure(func, repeats, max_time):
+    """ Time ``func`` up to ``repeats`` times, stopping early after ``max_time`` seconds. """
+    times = []
+    while len(times) < repeats and sum(times) < max_time:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'min_s': min(times), 'median_s': float(np.median(times)), 'runs': len(times)}
+
+
+def run_suite(assets, years, repeats=5, max_time=10., pattern=None):
+    """
+    Run every registered case for every market size.
+
+    :return: A list of result dictionaries with the case name, market size and timings.
+    """
+    import app
+    original_symbols = list(app.stock_symbols)
+    results = []
+    try:
+        for num_assets in assets:
+            for num_years in years:
+                market = Market(num_assets, num_years)
+                for name, setup in CASES:
+                    if pattern and pattern not in name:
+                        continue
+                    timings = measure(setup(market), repeats, max_time)
+                    results.append({'case': name, 'assets': num_assets,
+                                    'years': num_years, **timings})
+                    print(f"{name:<70} {num_assets:>5} {num_years:>3g}y "
+                          f"{timings['min_s']:>10.5f}s", file=sys.stderr)
+    finally:
+        app.stock_symbols[:] = original_symbols
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.25, noise_floor=0.001):
+    """
+    Compare the fastest time of every case with the baseline.
+
+    :param tolerance: Allowed relative slowdown.
+    :param noise_floor: Absolute slowdowns below this many seconds are ignored.
+    :return: A list of (case, assets, years, baseline seconds, seconds)
+        regressions, and a list of the (case, assets, years) results that have
+        no baseline and were not compared.
+    """
+    reference = {(r['case'], r['assets'], r['years']): r['min_s'] for r in baseline['results']}
+    regressions, missing = [], []
+    for result in results:
+        key = (result['case'], result['assets'], result['years'])
+        if key not in reference:
+            missing.append(key)
+            continue
+        before, after = reference[key], result['min_s']
+        if after > before * (1 + tolerance) and after - before > noise_floor:
+            regressions.append(key + (before, after))
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--assets', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-time', type=float, default=10.,
+                        help='Stop repeating a case after this many seconds.')
+    parser.add_argument('--filter', help='Only run cases whose name contains this text.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_suite(args.assets, args.years, args.repeats, args.max_time, args.filter)
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, missing = compare_with_baseline(results, json.load(f), args.tolerance)
+        for name, num_assets, num_years in missing:
+            print(f"NO BASELINE {name} ({num_assets} assets, {num_years}y): not compared",
+                  file=sys.stderr)
+        for name, num_assets, num_years, before, after in regressions:
+            print(f"REGRESSION {name} ({num_assets} assets, {num_years}y): "
+                  f"{before:.5f}s -> {after:.5f}s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline'
+              + (f', {len(missing)} cases without a baseline.' if missing else '.'), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_returns(num_assets, num_days, num_factors=3, seed=0):
+    """
+    Generate a deterministic DataFrame of daily returns with a factor structure.
+
+    :param num_assets: Number of assets (columns).
+    :param num_days: Number of business days (rows).
+    :param num_factors: Number of common factors driving the returns.
+    :param seed: Seed of the random generator.
+    :return: DataFrame of daily returns indexed by business day.
+    """
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0.0003, 0.01, size=(num_days, num_factors))
+    loadings = rng.uniform(0.2, 1.2, size=(num_factors, num_assets))
+    specific = rng.normal(0.0002, 0.015, size=(num_days, num_assets))
+    returns = factors @ loadings / num_factors + specific
+    index = pd.bdate_range('2000-01-03', periods=num_days, name='Date')
+    columns = [f'SYN{i:04d}' for i in range(num_assets)]
+    return pd.DataFrame(returns, index=index, columns=columns)
+
+
+def generate_market(num_assets, years, num_factors=3, seed=0):
+    """
+    Generate asset returns and the returns of a market index driven by the same factors.
+
+    :param num_assets: Number of assets.
+    :param years: Number of years of daily data (252 trading days per year).
+    :param num_factors: Number of common factors driving the returns.
+    :param seed: Seed of the random generator.
+    :return: A tuple of the asset returns DataFrame and the market returns
+        Series, named 'Close' like the index returns of the dashboard.
+    """
+    num_days = int(round(years * 252))
+    returns = generate_returns(num_assets, num_days, num_factors, seed)
+    rng = np.random.default_rng(seed + 1)
+    market = returns.mean(axis=1) + rng.normal(0, 0.002, size=num_days)
+    return returns, pd.Series(market, index=returns.index, name='Close')
+
+
+def synthetic_prices(returns, start_price=100.0):
+    """ Turn a returns DataFrame or Series into closing prices, one Series per symbol. """
+    prices = start_price * (1 + returns).cumprod()
+    if isinstance(prices, pd.Series):
+        return {prices.name: prices}
+    return {symbol: prices[symbol] for symbol in prices.columns}
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from features.portfolio_construction import PortfolioProblem
+from features.instrumentation import timed
+
+STRATEGIES = {
+    'mev': lambda problem, x0: problem.minimum_variance(x0=x0),
+    'miv': lambda problem, x0: problem.minimum_variance(x0=x0),
+    'mad': lambda problem, x0: problem.maximum_diversification(x0=x0),
+    'hrp': lambda problem, x0: problem.hierarchical_risk_parity(),
+}
+
+
+class RollingMoments:
+    """
+    Mean vector and covariance matrix of a window of return rows, updated in
+    place with rank-one updates as rows enter and leave the window.
+
+    Adding or removing a row costs O(N^2) instead of the O(W N^2) needed to
+    recompute the covariance of a W-row window from scratch.
+    """
+
+    def __init__(self, num_assets):
+        self.count = 0
+        self.mean = np.zeros(num_assets)
+        self.comoment = np.zeros((num_assets, num_assets))
+
+    def add(self, x):
+        """ Add a row of returns to the window (Welford update). """
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.comoment += np.outer(delta, x - self.mean)
+
+    def remove(self, x):
+        """ Remove a row of returns that was previously added to the window. """
+        if self.count <= 1:
+            self.__init__(len(self.mean))
+            return
+        new_mean = (self.count * self.mean - x) / (self.count - 1)
+        self.comoment -= np.outer(x - new_mean, x - self.mean)
+        self.mean = new_mean
+        self.count -= 1
+
+    @property
+    def cov(self):
+        """ Sample covariance (ddof=1) of the rows in the window. """
+        return self.comoment / (self.count - 1)
+
+
+def _period_key(date, rebalance):
+    if rebalance == 'monthly':
+        return date.year, date.month
+    if rebalance == 'quarterly':
+        return date.year, (date.month - 1) // 3
+    if rebalance == 'daily':
+        return date
+    return None
+
+
+@timed()
+def run_backtest(returns, strategies=('mev', 'miv', 'mad'), window=252,
+                 rebalance='monthly', drift_threshold=None, expanding=False):
+    """
+    Walk-forward backtest of portfolio construction methods.
+
+    On each rebalance date the strategies are re-solved on the returns of the
+    preceding window only, so there is no look-ahead. Between rebalances the
+    weights drift with the asset returns. All strategies share one set of
+    rolling moments, which is updated incrementally each day.
+
+    :param returns: DataFrame of historical daily returns.
+    :param strategies: Names from STRATEGIES, or a dictionary of name to a
+        function ``(PortfolioProblem, previous_weights) -> weights``.
+    :param window: Number of days in the estimation window (the initial
+        window when ``expanding`` is set).
+    :param rebalance: 'daily', 'monthly', 'quarterly', or None to rebalance
+        only on drift.
+    :param drift_threshold: Also rebalance when any weight drifts further than
+        this from its target weight.
+    :param expanding: Grow the estimation window instead of rolling it.
+    :return: A tuple of a DataFrame of daily portfolio returns (one column per
+        strategy) and a dictionary of strategy name to a DataFrame of target
+        weights indexed by rebalance date.
+    """
+    if not isinstance(strategies, dict):
+        strategies = {name: STRATEGIES[name] for name in strategies}
+    values = returns.values
+    dates = returns.index
+    num_days, num_assets = values.shape
+    if num_days <= window:
+        raise ValueError("Not enough history for the estimation window")
+
+    moments = RollingMoments(num_assets)
+    for row in values[:window]:
+        moments.add(row)
+
+    names = list(strategies)
+    target = {name: None for name in names}
+    current = {name: None for name in names}
+    rebalances = {name: [] for name in names}
+    portfolio_returns = np.empty((num_days - window, len(names)))
+    last_period = None
+
+    for t in range(window, num_days):
+        period = _period_key(dates[t], rebalance)
+        scheduled = period != last_period
+        last_period = period
+        problem = None
+        for name in names:
+            drifted = (drift_threshold is not None and current[name] is not None
+                       and np.abs(current[name] - target[name]).max() > drift_threshold)
+            if target[name] is None or (scheduled and rebalance is not None) or drifted:
+                if problem is None:
+                    problem = PortfolioProblem(moments.mean, moments.cov)
+                target[name] = strategies[name](problem, current[name])
+                current[name] = target[name]
+                rebalances[name].append((dates[t], target[name]))
+
+        x = values[t]
+        for j, name in enumerate(names):
+            grown = current[name] * (1 + x)
+            portfolio_returns[t - window, j] = grown.sum() - 1
+            current[name] = grown / grown.sum()
+
+        moments.add(x)
+        if not expanding:
+            moments.remove(values[t - window])
+
+    portfolio_returns = pd.DataFrame(portfolio_returns, index=dates[window:], columns=names)
+    weights = {name: pd.DataFrame([w for _, w in rebalances[name]],
+                                  index=[d for d, _ in rebalances[name]],
+                                  columns=returns.columns)
+               for name in names}
+    return portfolio_returns, weights
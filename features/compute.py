@@ -0,0 +1,137 @@
+import threading
+import time
+from features.instrumentation import metrics
+
+_registry = {}
+
+
+class Node:
+    """
+    A lazily evaluated, memoized value in the compute graph.
+
+    The value is computed from the values of ``deps`` the first time ``get``
+    is called and cached until the node, or one of its dependencies, is
+    invalidated or replaced with ``set``. ``version`` is bumped every time the
+    value changes, so it can be used in cache keys.
+
+    When ``store`` is set (see ``share_nodes``) the value is read from, and
+    computed once into, a store shared with other processes.
+    """
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.dependents = []
+        self._lock = threading.RLock()
+        self._has_value = False
+        self._value = None
+        self.version = 0
+        self.store = None
+        for dep in self.deps:
+            dep.dependents.append(self)
+        _registry[name] = self
+
+    @property
+    def computed(self):
+        return self._has_value
+
+    def get(self):
+        """ Return the node value, computing it (and its dependencies) on first use. """
+        if self._has_value:
+            return self._value
+        with self._lock:
+            if not self._has_value:
+                start = time.perf_counter()
+                if self.store is not None:
+                    self._value = self.store.get_or_compute(self.name, self._compute)
+                else:
+                    self._value = self._compute()
+                metrics.observe('portfolio_node_seconds', self.name, time.perf_counter() - start,
+                                help='Time to compute or load compute graph nodes.')
+                self._has_value = True
+                self.version += 1
+        return self._value
+
+    def _compute(self):
+        return self.func(*[dep.get() for dep in self.deps])
+
+    def set(self, value):
+        """ Replace the node value and invalidate everything computed from it. """
+        with self._lock:
+            self._value = value
+            self._has_value = True
+            self.version += 1
+        for dependent in self.dependents:
+            dependent.invalidate()
+
+    def invalidate(self):
+        """ Drop the cached value of this node and of all its dependents. """
+        with self._lock:
+            self._value = None
+            self._has_value = False
+        for dependent in self.dependents:
+            dependent.invalidate()
+
+    def __repr__(self):
+        state = 'computed' if self._has_value else 'pending'
+        return f"<Node {self.name} ({state})>"
+
+
+def node(name=None, deps=()):
+    """ Decorator turning a function of its dependencies' values into a Node. """
+    def decorator(func):
+        return Node(name or func.__name__, func, deps)
+    return decorator
+
+
+def get_node(name):
+    """ Look up a registered node by name. """
+    return _registry[name]
+
+
+def share_nodes(store, nodes=None):
+    """
+    Back the given nodes (all registered nodes by default) with a shared store,
+    so processes using the same store compute each value only once.
+    """
+    for n in list(nodes if nodes is not None else _registry.values()):
+        n.store = store
+
+
+def invalidate_all():
+    """ Drop the cached value of every registered node. """
+    for n in list(_registry.values()):
+        if not n.deps:
+            n.invalidate()
+
+
+def warm(nodes=None):
+    """ Compute the given nodes (all registered nodes by default), reporting failures. """
+    for n in list(nodes if nodes is not None else _registry.values()):
+        try:
+            n.get()
+        except Exception as e:
+            print(f"Error computing {n.name}: {e}")
+
+
+def warm_in_background(nodes=None):
+    """ Compute the given nodes on a daemon thread and return the thread. """
+    thread = threading.Thread(target=warm, args=(nodes,), name='compute-warmup',
+                              daemon=True)
+    thread.start()
+    return thread
+
+
+def lazy_module_getattr(module_name, nodes):
+    """
+    Build a module ``__getattr__`` that resolves attribute names to node values.
+
+    This keeps ``from module import name`` working for results that used to
+    be computed at import time, while deferring the work until first access.
+    """
+    def __getattr__(name):
+        if name in nodes:
+            return nodes[name].get()
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+    return __getattr__
@@ -0,0 +1,196 @@
+import os
+import numpy as np
+from scipy.spatial.distance import pdist, squareform
+from features.instrumentation import timed
+
+# Covariance estimator used by the dashboard: 'sample', 'ledoit_wolf' or 'factor'.
+default_covariance_method = os.environ.get('PORTFOLIO_COVARIANCE', 'sample')
+
+
+class DenseCovariance:
+    """ Covariance backend holding the full N x N matrix. """
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=float)
+
+    @property
+    def num_assets(self):
+        return self.matrix.shape[0]
+
+    def scaled(self, factor):
+        return DenseCovariance(self.matrix * factor)
+
+    def dot(self, weights):
+        """ Covariance times weights, for a weight vector or a K x N weights matrix. """
+        return weights @ self.matrix
+
+    def quad_form(self, weights):
+        """ Portfolio variance ``w' S w`` for a weight vector or each row of a matrix. """
+        return np.sum(weights * self.dot(weights), axis=-1)
+
+    def variances(self):
+        return np.diag(self.matrix).copy()
+
+    def solve(self, b):
+        return np.linalg.solve(self.matrix, b)
+
+    def subset(self, indices):
+        """ Covariance of a subset of the assets. """
+        return DenseCovariance(self.matrix[np.ix_(indices, indices)])
+
+    def to_dense(self):
+        return self.matrix
+
+    def correlation_distance(self):
+        """ Condensed correlation distances ``sqrt((1 - rho) / 2)`` of all asset pairs. """
+        std = np.sqrt(self.variances())
+        correlation = self.matrix / np.outer(std, std)
+        return squareform(np.sqrt(np.clip((1 - correlation) / 2, 0, None)), checks=False)
+
+    def cvxpy_quad_form(self, y):
+        import cvxpy as cp
+        return cp.quad_form(y, cp.psd_wrap(self.matrix))
+
+
+class FactorCovariance:
+    """
+    Covariance backend of a factor model ``S = B B' + diag(d)``.
+
+    Only the N x K loadings ``B`` and the N specific variances ``d`` are
+    stored, and every operation works from this factored form, so memory and
+    time are O(N K) instead of O(N^2).
+    """
+
+    def __init__(self, loadings, specific_variance):
+        self.loadings = np.asarray(loadings, dtype=float)
+        self.specific_variance = np.asarray(specific_variance, dtype=float)
+
+    @property
+    def num_assets(self):
+        return self.loadings.shape[0]
+
+    def scaled(self, factor):
+        return FactorCovariance(self.loadings * np.sqrt(factor),
+                                self.specific_variance * factor)
+
+    def dot(self, weights):
+        return (weights @ self.loadings) @ self.loadings.T + weights * self.specific_variance
+
+    def quad_form(self, weights):
+        exposures = weights @ self.loadings
+        return (np.sum(exposures**2, axis=-1)
+                + np.sum(weights**2 * self.specific_variance, axis=-1))
+
+    def variances(self):
+        return np.sum(self.loadings**2, axis=1) + self.specific_variance
+
+    def solve(self, b):
+        """ Solve ``S x = b`` with the Woodbury identity (a K x K solve). """
+        d_inv_b = b / self.specific_variance
+        d_inv_loadings = self.loadings / self.specific_variance[:, None]
+        capacitance = np.eye(self.loadings.shape[1]) + self.loadings.T @ d_inv_loadings
+        return d_inv_b - d_inv_loadings @ np.linalg.solve(capacitance, self.loadings.T @ d_inv_b)
+
+    def subset(self, indices):
+        return FactorCovariance(self.loadings[indices], self.specific_variance[indices])
+
+    def to_dense(self):
+        return self.loadings @ self.loadings.T + np.diag(self.specific_variance)
+
+    def correlation_distance(self):
+        """
+        Condensed correlation distances ``sqrt((1 - rho) / 2)`` of all asset
+        pairs, from the standardized loadings ``x = B / sigma`` and unexplained
+        variance shares ``u = d / sigma^2``: ``1 - rho_ij = (|x_i - x_j|^2 + u_i
+        + u_j) / 2``, so the N x N covariance is never built.
+        """
+        std = np.sqrt(self.variances())
+        unexplained = self.specific_variance / std**2
+        rows, columns = np.triu_indices(len(std), 1)
+        squared = (pdist(self.loadings / std[:, None], 'sqeuclidean')
+                   + unexplained[rows] + unexplained[columns])
+        return np.sqrt(np.clip(squared / 4, 0, None))
+
+    def cvxpy_quad_form(self, y):
+        import cvxpy as cp
+        return (cp.sum_squares(self.loadings.T @ y)
+                + cp.sum(cp.multiply(self.specific_variance, cp.square(y))))
+
+
+def _centered_values(returns):
+    values = np.asarray(returns, dtype=float)
+    return values - values.mean(axis=0)
+
+
+def sample_covariance(returns):
+    """ Sample covariance (ddof=1) of daily returns, as ``returns.cov()``. """
+    values = _centered_values(returns)
+    return DenseCovariance(values.T @ values / (len(values) - 1))
+
+
+def ledoit_wolf_covariance(returns):
+    """
+    Ledoit-Wolf shrinkage of the sample covariance towards a scaled identity.
+
+    The shrinkage intensity is the analytic estimate of Ledoit and Wolf
+    (2004), which keeps the matrix well conditioned when the number of assets
+    approaches the number of observations.
+    """
+    values = _centered_values(returns)
+    num_samples, num_assets = values.shape
+    emp_cov = values.T @ values / num_samples
+    mu = np.trace(emp_cov) / num_assets
+    squared = values**2
+    beta = (np.sum(np.sum(squared, axis=1)**2) / num_samples
+            - np.sum(emp_cov**2)) / (num_assets * num_samples)
+    delta = (np.sum(emp_cov**2) - 2 * mu * np.trace(emp_cov)
+             + num_assets * mu**2) / num_assets
+    beta = min(beta, delta)
+    shrinkage = 0. if beta == 0 else beta / delta
+    shrunk = (1 - shrinkage) * emp_cov
+    shrunk[np.diag_indices(num_assets)] += shrinkage * mu
+    return DenseCovariance(shrunk)
+
+
+def factor_covariance(returns, num_factors=5):
+    """
+    Statistical factor model of the covariance from the leading principal components.
+
+    The loadings come from a thin SVD of the T x N returns matrix, so the
+    N x N covariance is never formed. Whatever variance the factors do not
+    explain is kept as specific variance.
+    """
+    values = _centered_values(returns)
+    num_samples, num_assets = values.shape
+    num_factors = max(1, min(num_factors, num_assets - 1, num_samples - 1))
+    _, singular_values, components = np.linalg.svd(values, full_matrices=False)
+    loadings = (components[:num_factors].T * singular_values[:num_factors]
+                / np.sqrt(num_samples - 1))
+    total_variance = np.sum(values**2, axis=0) / (num_samples - 1)
+    specific_variance = np.maximum(total_variance - np.sum(loadings**2, axis=1),
+                                   1e-6 * total_variance)
+    return FactorCovariance(loadings, specific_variance)
+
+
+@timed()
+def estimate_covariance(returns, method='sample', **kwargs):
+    """
+    Estimate the daily covariance of returns with the selected backend.
+
+    :param returns: DataFrame (or array) of daily returns, or a ReturnsMatrix,
+        whose cached estimate is returned.
+    :param method: 'sample', 'ledoit_wolf' or 'factor'; an existing backend
+        object is returned unchanged.
+    :return: A DenseCovariance or FactorCovariance.
+    """
+    if not isinstance(method, str):
+        return method
+    if hasattr(returns, 'covariance_estimate'):
+        return returns.covariance_estimate(method, **kwargs)
+    if method == 'sample':
+        return sample_covariance(returns)
+    if method == 'ledoit_wolf':
+        return ledoit_wolf_covariance(returns)
+    if method == 'factor':
+        return factor_covariance(returns, **kwargs)
+    raise ValueError(f"Unknown covariance method: {method}")
@@ -1,38 +1,59 @@
 from datetime import datetime
 import pandas as pd
-import yfinance as yf
+from features.compute import node, lazy_module_getattr
+from features.price_store import default_price_store
+from features.instrumentation import timed
 
 
-def retrieve_historical_data(stock_list, start_date, end_date):
+@timed()
+def retrieve_historical_data(stock_list, start_date, end_date, store=None,
+                             max_workers=8, batch_size=20, retries=3,
+                             return_report=False):
     """
-    Retrieves historical data for a list of stocks from Yahoo Finance.
+    Retrieves historical data for a list of stocks.
+
+    Prices are served from the local price store, so only the dates missing
+    since the last sync are requested from the configured provider. Missing
+    dates are fetched in concurrent batches with per-symbol retries.
 
     :param stock_list: List of stock symbols.
     :param start_date: Start date for the historical data in 'YYYY-MM-DD' format.
     :param end_date: End date for the historical data in 'YYYY-MM-DD' format.
+    :param store: PriceStore to read from, defaults to the process-wide store.
+    :param max_workers: Maximum number of concurrent provider requests.
+    :param batch_size: Maximum number of symbols per provider request.
+    :param retries: Number of retries for a symbol that failed to download.
+    :param return_report: Also return the FetchReport of the download.
     :return: A dictionary with stock symbols as keys and their historical data as values.
     """
-    data = {}
-    for stock in stock_list:
-        try:
-            data[stock] = yf.download(stock, start=start_date, end=end_date)
-        except Exception as e:
-            print(f"Error retrieving data for {stock}: {e}")
+    store = store if store is not None else default_price_store()
+    data, report = store.load_many(stock_list, start_date, end_date,
+                                   max_workers=max_workers, batch_size=batch_size,
+                                   retries=retries)
+    for stock, error in report.failed.items():
+        print(f"Error retrieving data for {stock}: {error}")
+    if return_report:
+        return data, report
     return data
 
 
+@timed()
 def create_historical_returns_dataframe(banking_stocks_data):
-    close_prices = pd.DataFrame()
-    for stock, data in banking_stocks_data.items():
-        close_prices[stock] = data['Close']
+    closes = [data['Close'].rename(stock) for stock, data in banking_stocks_data.items()]
+    if not closes:
+        return pd.DataFrame()
+    # One concat on the first stock's dates instead of inserting column by column.
+    close_prices = pd.concat(closes, axis=1).reindex(closes[0].index)
     historical_returns = close_prices.pct_change()
     historical_returns = historical_returns.dropna()
     return historical_returns
 
 
-def retrieve_market_index_returns(index_symbol, start_date, end_date):
+@timed()
+def retrieve_market_index_returns(index_symbol, start_date, end_date, store=None):
     """ Retrieve and calculate market index returns. """
-    index_data = yf.download(index_symbol, start=start_date, end=end_date)
+    store = store if store is not None else default_price_store()
+    index_data = store.load(index_symbol, start_date, end_date)
     index_returns = index_data['Close'].pct_change().dropna()
     return index_returns
 
@@ -41,12 +62,29 @@ stock_symbols = ['SBIN.NS', 'HDFCBANK.NS', 'ICICIBANK.NS', 'AXISBANK.NS',
                  'KOTAKBANK.NS', 'INDUSINDBK.NS', 'PNB.NS', 'BANKBARODA.NS',
                  'FEDERALBNK.NS', 'YESBANK.NS']
 
+market_index_symbol = '^NSEI'
+
 start_date = '2020-01-01'
 end_date = datetime.now().strftime('%Y-%m-%d')
 
-banking_stocks_data = retrieve_historical_data(
-    stock_symbols, start_date, end_date)
 
-historical_returns = create_historical_returns_dataframe(banking_stocks_data)
-market_index_returns = retrieve_market_index_returns(
-    '^NSEI', start_date, end_date)
+@node()
+def banking_stocks_data_node():
+    return retrieve_historical_data(stock_symbols, start_date, end_date)
+
+
+@node(deps=[banking_stocks_data_node])
+def historical_returns_node(banking_stocks_data):
+    return create_historical_returns_dataframe(banking_stocks_data)
+
+
+@node()
+def market_index_returns_node():
+    return retrieve_market_index_returns(market_index_symbol, start_date, end_date)
+
+
+__getattr__ = lazy_module_getattr(__name__, {
+    'banking_stocks_data': banking_stocks_data_node,
+    'historical_returns': historical_returns_node,
+    'market_index_returns': market_index_returns_node,
+})
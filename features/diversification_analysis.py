@@ -1,20 +1,30 @@
 import numpy as np
-from features.data_retrieval import historical_returns
-from features.portfolio_construction import optimal_weights_mvo
+from features.compute import node, lazy_module_getattr
+from features.covariance import estimate_covariance
 import plotly.graph_objs as go
+from scipy.cluster.hierarchy import fcluster, leaves_list, linkage
+from features.instrumentation import timed
+from features.returns_matrix import returns_matrix_node
 
 
-def calculate_portfolio_variance(returns, weights):
-    """ Calculate the variance of the portfolio. """
-    portfolio_variance = np.dot(
-        weights.T, np.dot(returns.cov() * 252, weights))
+def calculate_portfolio_variance(returns, weights, covariance='sample'):
+    """
+    Calculate the variance of the portfolio.
+
+    :param covariance: Covariance estimator or backend, see
+        features.covariance.estimate_covariance. A factor model is used in its
+        factored form, without building the full covariance matrix.
+    """
+    portfolio_variance = estimate_covariance(
+        returns, covariance).scaled(252).quad_form(np.asarray(weights))
     return portfolio_variance
 
 
-def calculate_diversification_ratio(returns, weights):
+def calculate_diversification_ratio(returns, weights, covariance='sample'):
     """ Calculate the diversification ratio of the portfolio. """
-    portfolio_std = np.sqrt(calculate_portfolio_variance(returns, weights))
-    weighted_std = np.sum(weights * returns.std() * np.sqrt(252))
+    covariance = estimate_covariance(returns, covariance)
+    portfolio_std = np.sqrt(calculate_portfolio_variance(returns, weights, covariance))
+    weighted_std = np.sum(weights * np.sqrt(covariance.variances() * 252))
     diversification_ratio = portfolio_std / weighted_std
     return diversification_ratio
 
@@ -25,17 +35,138 @@ def calculate_effective_number_of_assets(weights):
     return ena
 
 
-def plot_correlation_heatmap(returns, title='Asset Diversification Heatmap'):
-    """ Plot a heatmap of asset correlations. """
-    correlation_matrix = returns.corr()
+def correlation_distance(standardized, block_size=256):
+    """
+    Condensed correlation distances ``sqrt((1 - rho) / 2)`` of all pairs of
+    columns of ``standardized``, centered returns scaled to unit norm so that
+    their dot products are the correlations. The correlations are computed
+    one block of rows at a time; the N x N matrix is never held.
+    """
+    num_assets = standardized.shape[1]
+    distance = np.empty(num_assets * (num_assets - 1) // 2)
+    position = 0
+    for start in range(0, num_assets, block_size):
+        block = standardized[:, start:start + block_size].T @ standardized[:, start:]
+        # Pairs (i, j) with j > i, in the row-major order of the condensed form.
+        upper = np.arange(block.shape[1]) > np.arange(len(block))[:, None]
+        values = np.sqrt(np.clip((1 - block[upper]) / 2, 0, None))
+        distance[position:position + len(values)] = values
+        position += len(values)
+    return distance
+
+
+class CorrelationClusters:
+    """
+    Asset correlations ordered by hierarchical clustering.
+
+    The assets are clustered with average linkage on the correlation distance
+    ``sqrt((1 - rho) / 2)``, and ``order`` lists them in dendrogram leaf
+    order, so that correlated assets sit next to each other and every flat
+    cluster of the tree is a contiguous range of that order.
+
+    Only the standardized returns and the linkage are kept: the correlations
+    of a heatmap tile are computed from the standardized returns when the
+    tile is drawn, so the N x N correlation matrix is never built.
+    """
+
+    def __init__(self, returns, method='average'):
+        self.symbols = np.asarray(returns.columns)
+        centered = np.asarray(returns, dtype=float)
+        centered = centered - centered.mean(axis=0)
+        self.standardized = centered / np.linalg.norm(centered, axis=0)
+        self.linkage = linkage(correlation_distance(self.standardized), method=method)
+        self.order = leaves_list(self.linkage)
+
+    @property
+    def num_assets(self):
+        return len(self.symbols)
+
+    def segments(self, start, end, max_size):
+        """
+        Split the leaf-order range ``[start, end)`` into at most about ``max_size``
+        contiguous segments that follow the cluster boundaries of the tree.
+
+        :return: Array of segment boundaries, from ``start`` to ``end``.
+        """
+        if end - start <= max_size:
+            return np.arange(start, end + 1)
+        num_clusters = max(1, min(self.num_assets, max_size * self.num_assets // (end - start)))
+        while True:
+            labels = fcluster(self.linkage, num_clusters, criterion='maxclust')[self.order[start:end]]
+            boundaries = start + np.flatnonzero(np.diff(labels)) + 1
+            # Cut deeper when the range falls inside too few clusters.
+            if len(boundaries) + 1 >= max_size // 2 or num_clusters >= self.num_assets:
+                break
+            num_clusters = min(self.num_assets, num_clusters * 2)
+        if len(boundaries) >= max_size:
+            boundaries = boundaries[np.unique(np.linspace(0, len(boundaries) - 1,
+                                                          max_size - 1).astype(int))]
+        return np.concatenate([[start], boundaries, [end]])
+
+    def tile(self, row_segments, column_segments):
+        """
+        Mean correlation of every block of a tile. The sum of the correlations
+        of a block is the dot product of the summed standardized returns of
+        its rows and of its columns, so only one sum per segment is computed.
+        """
+        rows = self.standardized[:, self.order[row_segments[0]:row_segments[-1]]]
+        columns = self.standardized[:, self.order[column_segments[0]:column_segments[-1]]]
+        row_sums = np.add.reduceat(rows, row_segments[:-1] - row_segments[0], axis=1)
+        column_sums = np.add.reduceat(columns, column_segments[:-1] - column_segments[0], axis=1)
+        return (row_sums.T @ column_sums) / np.outer(np.diff(row_segments), np.diff(column_segments))
+
+    def segment_labels(self, segments):
+        labels = []
+        for lo, hi in zip(segments[:-1], segments[1:]):
+            first = self.symbols[self.order[lo]]
+            labels.append(str(first) if hi - lo == 1 else f'{first} +{hi - lo - 1}')
+        return labels
+
+
+@timed()
+def plot_correlation_heatmap(returns, title='Asset Diversification Heatmap', max_size=60,
+                             clusters=None, view=None):
+    """
+    Plot a heatmap of asset correlations ordered by hierarchical clustering.
+
+    Up to ``max_size`` assets are shown one by one. Larger universes are shown
+    as blocks of clusters with their mean correlation; ``view`` selects the
+    tile to drill into, and only the correlations of that tile are used.
+
+    :param returns: DataFrame of historical returns (unused when ``clusters`` is given).
+    :param max_size: Maximum number of rows and columns of the heatmap.
+    :param clusters: Precomputed CorrelationClusters of the returns.
+    :param view: Optional (row start, row end, column start, column end) range
+        in cluster order; defaults to the whole matrix.
+    """
+    clusters = clusters if clusters is not None else CorrelationClusters(returns)
+    row_start, row_end, column_start, column_end = view or (0, clusters.num_assets) * 2
+    row_segments = clusters.segments(row_start, row_end, max_size)
+    column_segments = clusters.segments(column_start, column_end, max_size)
+    # Each cell carries the asset range it covers, for drilling down on click.
+    customdata = [[f'{r0},{r1},{c0},{c1}' for c0, c1 in zip(column_segments[:-1], column_segments[1:])]
+                  for r0, r1 in zip(row_segments[:-1], row_segments[1:])]
     fig = go.Figure(data=go.Heatmap(
-        z=correlation_matrix.values,
-        x=correlation_matrix.columns,
-        y=correlation_matrix.columns,
+        z=clusters.tile(row_segments, column_segments),
+        x=clusters.segment_labels(column_segments),
+        y=clusters.segment_labels(row_segments),
+        customdata=customdata,
         colorscale='Viridis'))
-    fig.update_layout(title=title, xaxis_nticks=len(
-        returns.columns), yaxis_nticks=len(returns.columns))
+    fig.update_layout(title=title, xaxis_nticks=len(column_segments),
+                      yaxis_nticks=len(row_segments), yaxis_autorange='reversed')
     return fig
 
 
-correlation_heatmap = plot_correlation_heatmap(historical_returns)
+@node(deps=[returns_matrix_node])
+def correlation_clusters_node(returns):
+    return CorrelationClusters(returns)
+
+
+@node(deps=[correlation_clusters_node])
+def correlation_heatmap_node(clusters):
+    return plot_correlation_heatmap(None, clusters=clusters)
+
+
+__getattr__ = lazy_module_getattr(__name__, {
+    'correlation_heatmap': correlation_heatmap_node,
+})
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from features.instrumentation import timed
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Select ``n_out`` points of a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the point kept in the previous
+    bucket and the average of the next bucket, which preserves the visual
+    shape (peaks, troughs and trends) of the line.
+
+    :param x: Array of numeric, increasing x values.
+    :param y: Array of y values.
+    :param n_out: Number of points to keep.
+    :return: Sorted array of the indices of the kept points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous])
+                       - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.nanargmax(areas)) if np.isfinite(areas).any() else lo
+        indices[i + 1] = previous
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """
+    Select about ``n_out`` points by keeping the minimum and maximum of each bucket.
+
+    :param y: Array of y values.
+    :param n_out: Number of points to keep (two per bucket).
+    :return: Sorted array of the indices of the kept points.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(int)
+    indices = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            indices.append(lo + int(np.nanargmin(y[lo:hi])) if np.isfinite(y[lo:hi]).any() else lo)
+            indices.append(lo + int(np.nanargmax(y[lo:hi])) if np.isfinite(y[lo:hi]).any() else lo)
+    return np.unique(indices)
+
+
+@timed()
+def downsample_frame(frame, max_points, method='lttb', x_range=None):
+    """
+    Downsample a time-indexed DataFrame for plotting.
+
+    Points are selected for every column and the union of the selections is
+    kept, so each line keeps its own shape while all columns share an index.
+
+    :param frame: DataFrame indexed by date, one column per line.
+    :param max_points: Target number of points per column.
+    :param method: 'lttb', 'minmax' or 'none'.
+    :param x_range: Optional (start, end) dates; only rows in this range are used.
+    :return: The downsampled DataFrame.
+    """
+    if x_range is not None:
+        frame = frame.loc[pd.Timestamp(x_range[0]):pd.Timestamp(x_range[1])]
+    if method == 'none' or len(frame) <= max_points:
+        return frame
+    x = frame.index.values.astype('datetime64[ns]').astype(np.int64)
+    selected = []
+    for column in frame.columns:
+        y = frame[column].values
+        if method == 'lttb':
+            selected.append(lttb_indices(x, y, max_points))
+        elif method == 'minmax':
+            selected.append(minmax_indices(y, max_points))
+        else:
+            raise ValueError(f"Unknown downsampling method: {method}")
+    return frame.iloc[np.unique(np.concatenate(selected))]
+
+
+def relayout_x_range(relayout_data):
+    """
+    Extract the x-axis range selected by the user from Plotly ``relayoutData``.
+
+    :return: A (start, end) tuple, or None when the full range is shown.
+    """
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
@@ -0,0 +1,111 @@
+import os
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from features.compute import node
+from features.covariance import default_covariance_method
+from features.returns_matrix import returns_matrix_node
+from features.portfolio_construction import PortfolioProblem
+from features.process_pool import shared_executor
+from features.instrumentation import timed
+
+# Below this many assets a whole frontier is solved faster in this process
+# than by dispatching chunks to worker processes.
+PARALLEL_MIN_ASSETS = 20
+
+
+def _solve_frontier_chunk(mean, covariance, targets, x0):
+    """
+    Solve a contiguous run of target-return problems, warm-starting each
+    solve from its neighbour's solution.
+    """
+    problem = PortfolioProblem(mean, covariance, periods=1)
+    weights = []
+    for target in targets:
+        x0 = problem.minimum_variance_for_return(target, x0)
+        weights.append(x0)
+    return np.array(weights)
+
+
+@timed()
+def compute_efficient_frontier(returns, num_points=100, processes=None, covariance='sample'):
+    """
+    Compute the long-only efficient frontier as a sweep of target-return problems.
+
+    The targets run from the minimum variance portfolio's return up to the
+    highest single-asset return, and every solve is warm-started from the
+    previous point's weights. Small universes are solved in one sweep in
+    this process. Otherwise the targets are split into one contiguous chunk
+    per worker of a process pool shared across calls, and each chunk starts
+    from the blend of the minimum variance portfolio and the highest-return
+    asset that meets its first target return.
+
+    :param returns: DataFrame of historical returns.
+    :param num_points: Number of points on the frontier.
+    :param processes: Number of worker processes; 1 solves in this process.
+        Defaults to the number of CPUs, or 1 below PARALLEL_MIN_ASSETS assets.
+    :param covariance: Covariance estimator, see features.covariance.estimate_covariance.
+    :return: A tuple of a DataFrame with 'Return', 'Volatility' and 'Sharpe Ratio'
+        columns and an array of the frontier weights, one row per point.
+    """
+    problem = PortfolioProblem.from_returns(returns, covariance=covariance)
+    min_variance_weights = problem.minimum_variance()
+    targets = np.linspace(min_variance_weights @ problem.mean,
+                          problem.mean.max(), num_points)
+
+    if processes is None:
+        processes = (os.cpu_count() or 1) if problem.num_assets >= PARALLEL_MIN_ASSETS else 1
+    chunks = [chunk for chunk in np.array_split(
+        targets, min(processes, num_points)) if len(chunk)]
+    args = (problem.mean, problem.covariance)
+    if len(chunks) == 1:
+        weights = _solve_frontier_chunk(*args, targets, min_variance_weights)
+    else:
+        # Points on the segment from the minimum variance portfolio to the
+        # highest-return asset are feasible and meet the target return exactly.
+        top_asset = np.zeros(problem.num_assets)
+        top_asset[np.argmax(problem.mean)] = 1
+        span = targets[-1] - targets[0] or 1
+        executor = shared_executor(len(chunks))
+        futures = []
+        for chunk in chunks:
+            share = (chunk[0] - targets[0]) / span
+            x0 = (1 - share) * min_variance_weights + share * top_asset
+            futures.append(executor.submit(_solve_frontier_chunk, *args, chunk, x0))
+        weights = np.vstack([future.result() for future in futures])
+
+    frontier_returns = weights @ problem.mean
+    frontier_volatility = np.sqrt(problem.covariance.quad_form(weights))
+    frontier = pd.DataFrame({
+        'Return': frontier_returns,
+        'Volatility': frontier_volatility,
+        'Sharpe Ratio': frontier_returns / frontier_volatility,
+    })
+    return frontier, weights
+
+
+@timed()
+def plot_efficient_frontier(frontier, portfolios=None, title='Efficient Frontier'):
+    """
+    Plot the efficient frontier with optional named portfolios marked on it.
+
+    :param frontier: DataFrame returned by compute_efficient_frontier.
+    :param portfolios: Optional dictionary of label to (return, volatility) tuples.
+    """
+    fig = go.Figure(go.Scatter(
+        x=frontier['Volatility'], y=frontier['Return'], mode='lines',
+        name='Efficient Frontier', customdata=frontier['Sharpe Ratio'],
+        hovertemplate='Volatility %{x:.2%}<br>Return %{y:.2%}'
+                      '<br>Sharpe %{customdata:.2f}<extra></extra>'))
+    for label, (portfolio_return, portfolio_volatility) in (portfolios or {}).items():
+        fig.add_trace(go.Scatter(x=[portfolio_volatility], y=[portfolio_return],
+                                 mode='markers', marker={'size': 12}, name=label))
+    fig.update_layout(title=title, xaxis_title='Annualized Volatility',
+                      yaxis_title='Annualized Return', xaxis_tickformat='.0%',
+                      yaxis_tickformat='.0%')
+    return fig
+
+
+@node(deps=[returns_matrix_node])
+def efficient_frontier_node(returns):
+    return compute_efficient_frontier(returns, covariance=default_covariance_method)
@@ -0,0 +1,180 @@
+from bisect import bisect_left
+from functools import wraps
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(1024 * 4**i for i in range(8))
+
+
+def _escape_label(value):
+    """ Escape a label value for the Prometheus text format. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(text):
+    """ Escape the text of a HELP line for the Prometheus text format. """
+    return str(text).replace('\\', '\\\\').replace('\n', '\\n')
+
+
+class Histogram:
+    """ Cumulative histogram with fixed bucket upper bounds, as in Prometheus. """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters and histograms, labelled by a single
+    ``name`` label (the function, node, callback or cache being measured).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.caches = {}
+        self.help = {}
+
+    def increment(self, metric, name, amount=1, help=''):
+        with self._lock:
+            self.help.setdefault(metric, help)
+            key = (metric, name)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, metric, name, value, buckets=LATENCY_BUCKETS, help=''):
+        with self._lock:
+            self.help.setdefault(metric, help)
+            key = (metric, name)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def register_cache(self, name, cache):
+        """ Report the hits, misses and size of an LRUCache. """
+        self.caches[name] = cache
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def summary(self):
+        """
+        Per-name call count, total and mean latency of every timed function,
+        sorted by total time, for the debug panel.
+        """
+        with self._lock:
+            rows = [{'name': name, 'calls': histogram.count,
+                     'total (s)': histogram.sum,
+                     'mean (ms)': 1000 * histogram.sum / histogram.count}
+                    for (metric, name), histogram in self.histograms.items()
+                    if metric == 'portfolio_function_seconds' and histogram.count]
+        return sorted(rows, key=lambda row: row['total (s)'], reverse=True)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format, with the
+        HELP and TYPE of every metric family and escaped label values.
+        """
+        lines = []
+        with self._lock:
+            for metric in sorted({metric for metric, _ in self.counters}):
+                lines.append(f'# HELP {metric} {_escape_help(self.help[metric])}')
+                lines.append(f'# TYPE {metric} counter')
+                for (other, name), value in sorted(self.counters.items()):
+                    if other == metric:
+                        lines.append(f'{metric}{{name="{_escape_label(name)}"}} {value}')
+            for metric in sorted({metric for metric, _ in self.histograms}):
+                lines.append(f'# HELP {metric} {_escape_help(self.help[metric])}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (other, name), histogram in sorted(self.histograms.items()):
+                    if other != metric:
+                        continue
+                    label = _escape_label(name)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{name="{label}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{name="{label}"}} {histogram.count}')
+        for metric, attribute, kind, help in (
+                ('portfolio_cache_hits_total', 'hits', 'counter', 'Result cache lookups that hit.'),
+                ('portfolio_cache_misses_total', 'misses', 'counter',
+                 'Result cache lookups that missed.'),
+                ('portfolio_cache_entries', '__len__', 'gauge', 'Entries in the result cache.'),
+                ('portfolio_cache_hit_ratio', 'hit_rate', 'gauge',
+                 'Fraction of result cache lookups that hit.')):
+            if not self.caches:
+                break
+            lines.append(f'# HELP {metric} {help}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, cache in sorted(self.caches.items()):
+                value = getattr(cache, attribute)
+                lines.append(f'{metric}{{name="{_escape_label(name)}"}} '
+                             f'{value() if callable(value) else value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+def timed(name=None):
+    """
+    Decorator recording the call count, errors and latency histogram of a function.
+
+    :param name: Label of the function in the metrics; defaults to its
+        ``module.qualname``.
+    """
+    def decorator(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                metrics.increment('portfolio_function_errors_total', label,
+                                  help='Calls that raised an exception.')
+                raise
+            finally:
+                metrics.observe('portfolio_function_seconds', label,
+                                time.perf_counter() - start,
+                                help='Latency of instrumented functions and callbacks.')
+        return wrapper
+    return decorator
+
+
+def record_payload(name, size):
+    """ Record the size in bytes of a payload sent to the browser. """
+    metrics.observe('portfolio_payload_bytes', name, size, SIZE_BUCKETS,
+                    help='Size of callback responses in bytes.')
+
+
+def install_metrics_endpoint(server, path='/metrics'):
+    """
+    Serve the metrics on a Flask server and record the response size of every
+    Dash callback, labelled by its output.
+    """
+    from flask import Response, request
+
+    @server.route(path)
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @server.after_request
+    def record_callback_payload(response):
+        if request.path.endswith('_dash-update-component') and response.content_length:
+            output = (request.get_json(silent=True) or {}).get('output', 'unknown')
+            record_payload(output, response.content_length)
+        return response
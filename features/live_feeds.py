@@ -0,0 +1,124 @@
+import importlib
+import os
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Minutes in an NSE trading session (09:15 to 15:30), the default tick count per day.
+TICKS_PER_DAY = 375
+
+
+class QueueFeed:
+    """
+    Feed of ticks pushed by another thread, e.g. a websocket or broker client.
+
+    A tick is a timestamp and a mapping of symbol to last traded price; it
+    may quote only some of the symbols.
+    """
+
+    name = 'queue'
+
+    def __init__(self, ticks_per_day=TICKS_PER_DAY):
+        self.ticks_per_day = ticks_per_day
+        self._queue = queue.SimpleQueue()
+
+    def push(self, timestamp, prices):
+        """ Enqueue one tick. """
+        self._queue.put((pd.Timestamp(timestamp), dict(prices)))
+
+    def poll(self, max_ticks=1000):
+        """ Return the ticks received since the last poll, oldest first. """
+        ticks = []
+        while len(ticks) < max_ticks:
+            try:
+                ticks.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return ticks
+
+
+class SimulatedFeed:
+    """
+    Local feed of simulated intraday prices, for testing the live mode offline.
+
+    Prices follow a correlated geometric random walk whose daily mean and
+    covariance are scaled down to one tick. Ticks are produced at
+    ``interval`` seconds of wall-clock time, so a slow client catches up on
+    its next poll; each tick advances the simulated market clock by one
+    trading minute.
+    """
+
+    name = 'simulated'
+
+    def __init__(self, symbols, mean, covariance, interval=1.0, ticks_per_day=TICKS_PER_DAY,
+                 start=None, seed=None, clock=time.monotonic):
+        """
+        :param symbols: Symbols quoted by the feed, including the benchmark.
+        :param mean: Mean daily return of every symbol.
+        :param covariance: Daily covariance matrix of the symbols' returns.
+        :param interval: Wall-clock seconds between two ticks.
+        :param ticks_per_day: Number of ticks in a trading day.
+        :param start: Simulated timestamp of the first tick; defaults to today's open.
+        :param seed: Seed of the random generator.
+        :param clock: Function returning the current wall-clock time in seconds.
+        """
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.ticks_per_day = ticks_per_day
+        self.drift = np.asarray(mean, dtype=float) / ticks_per_day
+        covariance = np.asarray(covariance, dtype=float) / ticks_per_day
+        # A small ridge keeps the factorization defined for singular covariances.
+        self.chol = np.linalg.cholesky(covariance + 1e-12 * np.eye(len(covariance)))
+        self.prices = np.full(len(self.symbols), 100.0)
+        self.timestamp = pd.Timestamp(start) if start is not None else \
+            pd.Timestamp.now().normalize() + pd.Timedelta(hours=9, minutes=15)
+        self.rng = np.random.default_rng(seed)
+        self.clock = clock
+        self._next = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_returns(cls, returns, **kwargs):
+        """ Calibrate the simulated prices on a DataFrame of daily returns. """
+        returns = returns.dropna()
+        return cls(returns.columns, returns.mean().values, returns.cov().values, **kwargs)
+
+    def poll(self, max_ticks=1000):
+        """ Return the ticks due since the last poll, oldest first. """
+        with self._lock:
+            now = self.clock()
+            ticks = []
+            while self._next <= now and len(ticks) < max_ticks:
+                self._next += self.interval
+                shocks = self.chol @ self.rng.standard_normal(len(self.symbols))
+                self.prices = self.prices * np.exp(self.drift + shocks)
+                self.timestamp += pd.Timedelta(minutes=1)
+                ticks.append((self.timestamp, dict(zip(self.symbols, self.prices))))
+            # Ticks beyond max_ticks are skipped rather than replayed on later polls.
+            if self._next <= now:
+                self._next = now + self.interval
+            return ticks
+
+
+def feed_from_env(symbols, returns, interval=1.0):
+    """
+    Build the live price feed selected by ``PORTFOLIO_LIVE_FEED``.
+
+    ``simulated`` (the default) calibrates a SimulatedFeed on ``returns``, a
+    DataFrame of daily returns of ``symbols``, to tick every ``interval``
+    seconds; ``queue`` returns a QueueFeed.
+    Any other value is imported as ``package.module:ClassName`` and called
+    with the list of symbols; the class must provide ``poll(max_ticks)`` and
+    a ``ticks_per_day`` attribute.
+    """
+    name = os.environ.get('PORTFOLIO_LIVE_FEED', 'simulated')
+    if name == 'simulated':
+        return SimulatedFeed.from_returns(returns[list(symbols)], interval=interval)
+    if name == 'queue':
+        return QueueFeed()
+    if ':' in name:
+        module, _, attribute = name.partition(':')
+        return getattr(importlib.import_module(module), attribute)(list(symbols))
+    raise ValueError(f"Unknown live feed: {name}")
@@ -0,0 +1,160 @@
+from collections import deque
+from itertools import islice
+import threading
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from features.instrumentation import timed
+from features.rolling_risk import ROLLING_METRICS, RollingRiskAccumulator, plot_rolling_metrics
+
+
+class LivePortfolio:
+    """
+    Running state of one portfolio in a live session: its rolling risk
+    accumulator, which also tracks its cumulative wealth, and a bounded
+    buffer of the latest points for the charts.
+    """
+
+    def __init__(self, weights, window, risk_free_rate, periods_per_year,
+                 benchmark_wealth, buffer_size):
+        self.weights = np.asarray(weights, dtype=float)
+        self.risk = RollingRiskAccumulator(window, risk_free_rate, periods_per_year)
+        self.benchmark_start = benchmark_wealth
+        self.points = deque(maxlen=buffer_size)
+
+    def update(self, sequence, timestamp, asset_returns, market_return, benchmark_wealth):
+        """ Add one tick; O(N) in the number of assets and O(1) in the history. """
+        portfolio_return = float(self.weights @ asset_returns)
+        metrics = self.risk.update(portfolio_return, market_return)
+        self.points.append((sequence, timestamp, portfolio_return, market_return,
+                            self.risk.wealth - 1, benchmark_wealth / self.benchmark_start - 1,
+                            tuple(metrics[metric] for metric in ROLLING_METRICS)))
+
+
+class LiveSession:
+    """
+    Incremental portfolio analytics over a live price feed.
+
+    Every tick turns the last traded prices into one return per asset and
+    updates each tracked portfolio's returns, cumulative returns and rolling
+    risk metrics in constant time, whatever the length of the history. Each
+    portfolio keeps its latest ``buffer_size`` points, numbered by tick, so
+    that clients can fetch only the points after the last one they drew.
+
+    Points start once every symbol and the benchmark have been quoted; their
+    first quotes are the reference prices. Symbols missing from a tick keep
+    their last price.
+    """
+
+    def __init__(self, feed, symbols, benchmark, risk_free_rate, buffer_size=2000):
+        """
+        :param feed: Price feed with ``poll(max_ticks)`` and ``ticks_per_day``.
+        :param symbols: Symbols of the portfolio assets, in weight order.
+        :param benchmark: Symbol of the benchmark index.
+        :param risk_free_rate: Annual risk-free rate.
+        :param buffer_size: Number of points kept per portfolio.
+        """
+        self.feed = feed
+        self.symbols = list(symbols)
+        self.benchmark = benchmark
+        self.periods_per_year = 252 * feed.ticks_per_day
+        self.risk_free_rate = risk_free_rate / self.periods_per_year
+        self.buffer_size = buffer_size
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.positions[benchmark] = len(self.symbols)
+        self.last = np.full(len(self.symbols) + 1, np.nan)
+        self.benchmark_wealth = 1.0
+        self.sequence = 0
+        self.portfolios = {}
+        self._lock = threading.Lock()
+
+    def track(self, name, weights, window):
+        """
+        Start tracking a portfolio from the next tick, if it is not tracked yet.
+
+        :param name: Key of the portfolio in this session.
+        :param weights: Weights of the assets, in the order of ``symbols``.
+        :param window: Number of ticks in the rolling risk window.
+        :return: The number of the last tick, a cursor for ``points_since``.
+        """
+        with self._lock:
+            if name not in self.portfolios:
+                self.portfolios[name] = LivePortfolio(
+                    weights, window, self.risk_free_rate, self.periods_per_year,
+                    self.benchmark_wealth, self.buffer_size)
+            return self.sequence
+
+    @timed()
+    def advance(self, max_ticks=1000):
+        """ Process the ticks the feed has received since the last call. """
+        with self._lock:
+            for timestamp, prices in self.feed.poll(max_ticks):
+                self._tick(timestamp, prices)
+
+    def _tick(self, timestamp, prices):
+        current = self.last.copy()
+        for symbol, price in prices.items():
+            position = self.positions.get(symbol)
+            if position is not None:
+                current[position] = price
+        previous, self.last = self.last, current
+        if np.isnan(previous).any():
+            return
+        returns = current / previous - 1
+        market_return = float(returns[-1])
+        self.sequence += 1
+        self.benchmark_wealth *= 1 + market_return
+        for portfolio in self.portfolios.values():
+            portfolio.update(self.sequence, timestamp, returns[:-1], market_return,
+                             self.benchmark_wealth)
+
+    def points_since(self, name, cursor):
+        """
+        Return the points of a portfolio after tick ``cursor``, oldest first,
+        and the new cursor. Points older than the buffer are lost.
+        """
+        with self._lock:
+            points = self.portfolios[name].points
+            if not points or points[-1][0] <= cursor:
+                return [], cursor
+            start = max(len(points) - (points[-1][0] - cursor), 0)
+            return list(islice(points, start, None)), points[-1][0]
+
+    def metrics(self, name):
+        """ Current rolling risk metrics of a tracked portfolio. """
+        with self._lock:
+            return self.portfolios[name].risk.metrics()
+
+
+def live_figures(title='Live'):
+    """
+    Empty figures of the live returns, cumulative returns and rolling risk,
+    with the traces that ``live_extend_data`` appends to.
+    """
+    returns_fig = go.Figure([go.Scatter(x=[], y=[], mode='lines', name=name)
+                             for name in ('Portfolio Returns', 'Benchmark Returns')])
+    returns_fig.update_layout(title=f'{title} Portfolio Returns v/s Benchmark Returns (%)')
+    cumulative_fig = go.Figure([go.Scatter(x=[], y=[], mode='lines', name=name)
+                                for name in ('Portfolio Returns', 'Benchmark Returns')])
+    cumulative_fig.update_layout(
+        title=f'{title} Portfolio Cumulative Returns v/s Benchmark Cumulative Returns (%)')
+    risk_fig = plot_rolling_metrics(pd.DataFrame(columns=ROLLING_METRICS),
+                                    title=f'{title} Rolling Risk Metrics')
+    return returns_fig, cumulative_fig, risk_fig
+
+
+def live_extend_data(points, max_points):
+    """
+    Convert live points into ``extendData`` payloads for the three figures of
+    ``live_figures``, keeping at most ``max_points`` points per trace.
+    """
+    x = [timestamp.isoformat() for _, timestamp, *_ in points]
+    columns = list(zip(*[point[2:6] for point in points]))
+    returns = [[round(100 * value, 4) for value in column] for column in columns]
+    metrics = list(zip(*[point[6] for point in points]))
+    return (
+        [{'x': [x, x], 'y': returns[:2]}, [0, 1], max_points],
+        [{'x': [x, x], 'y': returns[2:]}, [0, 1], max_points],
+        [{'x': [x] * len(ROLLING_METRICS), 'y': [list(column) for column in metrics]},
+         list(range(len(ROLLING_METRICS))), max_points],
+    )
@@ -1,7 +1,12 @@
 import numpy as np
 import pandas as pd
+from scipy.cluster.hierarchy import leaves_list, linkage
 from scipy.optimize import minimize
-from features.data_retrieval import historical_returns
+from features.compute import node, lazy_module_getattr
+from features.covariance import DenseCovariance, estimate_covariance
+from features.diversification_analysis import correlation_clusters_node
+from features.instrumentation import timed
+from features.universe import return_moments_node
 
 
 def calculate_portfolio_metrics(returns, weights):
@@ -19,60 +24,281 @@ def calculate_portfolio_metrics(returns, weights):
     return portfolio_return, portfolio_volatility, sharpe_ratio
 
 
-def mean_variance_optimization(returns):
+class PortfolioProblem:
+    """
+    Long-only, fully invested portfolio problem with precomputed moments.
+
+    The annualized mean vector and covariance are computed once, so
+    objective evaluations only cost a matrix-vector product, and every
+    objective comes with its exact gradient for the SLSQP solver. Problems
+    that reduce to a quadratic program are solved in closed form when the
+    unconstrained optimum is long-only, and otherwise with a dedicated QP
+    solver (cvxpy) when it is installed.
+
+    The covariance may be a dense matrix or a covariance backend from
+    features.covariance; a FactorCovariance is used in its factored form
+    throughout, without building the N x N matrix.
+    """
+
+    def __init__(self, mean, cov, periods=252):
+        if not hasattr(cov, 'quad_form'):
+            cov = DenseCovariance(cov)
+        self.mean = np.asarray(mean, dtype=float) * periods
+        self.covariance = cov.scaled(periods)
+        self.std = np.sqrt(self.covariance.variances())
+        self.num_assets = len(self.mean)
+        # Method that produced the last weights: 'closed_form', 'qp' or 'slsqp'.
+        self.last_method = None
+
+    @classmethod
+    def from_returns(cls, returns, periods=252, covariance='sample'):
+        """
+        Build a problem from a DataFrame of historical (daily) returns.
+
+        :param covariance: Covariance estimator, see features.covariance.estimate_covariance.
+        """
+        return cls(np.asarray(returns.mean()), estimate_covariance(returns, covariance), periods)
+
+    def volatility(self, weights):
+        return np.sqrt(self.covariance.quad_form(weights))
+
+    def volatility_jac(self, weights):
+        cov_w = self.covariance.dot(weights)
+        return cov_w / np.sqrt(weights @ cov_w)
+
+    def negative_diversification_ratio(self, weights):
+        return -(weights @ self.std) / self.volatility(weights)
+
+    def negative_diversification_ratio_jac(self, weights):
+        cov_w = self.covariance.dot(weights)
+        volatility = np.sqrt(weights @ cov_w)
+        weighted_volatility = weights @ self.std
+        return -(self.std / volatility - weighted_volatility * cov_w / volatility**3)
+
+    def _slsqp(self, fun, jac, x0=None, constraints=()):
+        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1,
+                        'jac': lambda x: np.ones_like(x)}] + list(constraints)
+        bounds = tuple((0, 1) for asset in range(self.num_assets))
+        if x0 is None:
+            x0 = np.full(self.num_assets, 1. / self.num_assets)
+        result = minimize(fun, x0, jac=jac, method='SLSQP',
+                          bounds=bounds, constraints=constraints)
+        self.last_method = 'slsqp'
+        return result.x
+
+    def _long_only_qp(self, a, method):
+        """
+        Solve ``min y' cov y`` subject to ``a' y = 1`` and ``y >= 0``.
+
+        The solution is returned rescaled to sum to one, or None when the
+        requested method cannot solve the problem.
+        """
+        if method in ('auto', 'closed_form'):
+            try:
+                y = self.covariance.solve(a)
+            except np.linalg.LinAlgError:
+                y = None
+            if y is not None and np.all(y / (a @ y) >= -1e-12):
+                y = np.clip(y / (a @ y), 0, None)
+                self.last_method = 'closed_form'
+                return y / y.sum()
+        if method in ('auto', 'qp'):
+            try:
+                import cvxpy as cp
+            except ImportError:
+                if method == 'qp':
+                    raise
+                return None
+            y = cp.Variable(self.num_assets)
+            problem = cp.Problem(cp.Minimize(self.covariance.cvxpy_quad_form(y)),
+                                 [a @ y == 1, y >= 0])
+            problem.solve()
+            if y.value is None:
+                return None
+            y = np.clip(y.value, 0, None)
+            self.last_method = 'qp'
+            return y / y.sum()
+        return None
+
+    def _auto_qp_method(self, method, x0):
+        """
+        Method passed to ``_long_only_qp``. With starting weights, 'auto'
+        only tries the closed form and then solves with SLSQP from ``x0``: a
+        nearby start converges in a few iterations, while the QP is rebuilt
+        and solved cold every time.
+        """
+        return 'closed_form' if method == 'auto' and x0 is not None else method
+
+    def minimum_variance(self, method='auto', x0=None):
+        """
+        Find the long-only, fully invested weights with the lowest volatility.
+
+        :param method: 'closed_form', 'qp', 'slsqp', or 'auto' to use the
+            fastest method that solves the problem. Methods that cannot solve
+            the problem fall back to SLSQP.
+        :param x0: Optional starting weights for the SLSQP solver; with
+            'auto', the solve falls back to SLSQP from them instead of the QP.
+        :return: Optimal weights for the portfolio.
+        """
+        weights = self._long_only_qp(np.ones(self.num_assets), self._auto_qp_method(method, x0))
+        if weights is not None:
+            return weights
+        return self._slsqp(self.volatility, self.volatility_jac, x0)
+
+    def maximum_diversification(self, method='auto', x0=None):
+        """
+        Find the long-only, fully invested weights with the highest diversification ratio.
+
+        Maximising the diversification ratio is equivalent to minimising
+        ``y' cov y`` subject to ``std' y = 1`` and rescaling ``y`` to sum to one.
+
+        :param method: 'closed_form', 'qp', 'slsqp', or 'auto' to use the
+            fastest method that solves the problem. Methods that cannot solve
+            the problem fall back to SLSQP.
+        :param x0: Optional starting weights for the SLSQP solver; with
+            'auto', the solve falls back to SLSQP from them instead of the QP.
+        :return: Optimal weights for the portfolio.
+        """
+        weights = self._long_only_qp(self.std, self._auto_qp_method(method, x0))
+        if weights is not None:
+            return weights
+        return self._slsqp(self.negative_diversification_ratio,
+                           self.negative_diversification_ratio_jac, x0)
+
+    def minimum_variance_for_return(self, target_return, x0=None):
+        """
+        Find the long-only, fully invested weights with the lowest volatility
+        for a given annualized expected return.
+
+        :param target_return: Annualized expected return the portfolio must achieve.
+        :param x0: Optional starting weights, e.g. a neighbouring frontier solution.
+        :return: Optimal weights for the portfolio.
+        """
+        constraint = {'type': 'eq', 'fun': lambda x: x @ self.mean - target_return,
+                      'jac': lambda x: self.mean}
+        return self._slsqp(self.volatility, self.volatility_jac, x0, [constraint])
+
+    def hierarchical_risk_parity(self, order=None):
+        """
+        Find the Hierarchical Risk Parity weights (Lopez de Prado, 2016).
+
+        The assets are ordered so that correlated assets are adjacent, then the
+        ordered list is recursively bisected and each half receives a share of
+        its parent's weight inversely proportional to its variance under
+        inverse-variance weights. Only variances of sub-blocks are needed:
+        there is no iterative solve and the covariance is never inverted.
+
+        :param order: Optional cluster order of the assets, e.g.
+            CorrelationClusters.order; by default the assets are clustered on
+            the correlation distances of the covariance backend, which a
+            factor model computes from its loadings.
+        :return: Optimal weights for the portfolio.
+        """
+        variances = self.covariance.variances()
+        if order is None:
+            order = leaves_list(linkage(self.covariance.correlation_distance(), method='average'))
+
+        def cluster_variance(indices):
+            inverse_variance = 1 / variances[indices]
+            cluster_weights = inverse_variance / inverse_variance.sum()
+            return self.covariance.subset(indices).quad_form(cluster_weights)
+
+        weights = np.ones(len(variances))
+        clusters = [np.asarray(order)]
+        while clusters:
+            clusters = [half for cluster in clusters if len(cluster) > 1
+                        for half in (cluster[:len(cluster) // 2], cluster[len(cluster) // 2:])]
+            for left, right in zip(clusters[::2], clusters[1::2]):
+                left_variance, right_variance = cluster_variance(left), cluster_variance(right)
+                alpha = 1 - left_variance / (left_variance + right_variance)
+                weights[left] *= alpha
+                weights[right] *= 1 - alpha
+        return weights
+
+
+@timed()
+def mean_variance_optimization(returns, method='auto', covariance='sample'):
     """
     Perform mean-variance optimization to find the optimal weights.
 
     :param returns: DataFrame of historical returns.
+    :param method: Solver method, see PortfolioProblem.minimum_variance.
+    :param covariance: Covariance estimator, see features.covariance.estimate_covariance.
     :return: Optimal weights for the portfolio.
     """
-    num_assets = len(returns.columns)
-    args = (returns,)
-    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-    bounds = tuple((0, 1) for asset in range(num_assets))
-    initial_guess = num_assets * [1. / num_assets,]
+    return PortfolioProblem.from_returns(returns, covariance=covariance).minimum_variance(method)
+
+
+@timed()
+def minimum_variance_portfolio(returns, method='auto', covariance='sample'):
+    return PortfolioProblem.from_returns(returns, covariance=covariance).minimum_variance(method)
+
+
+@timed()
+def maximum_diversification_portfolio(returns, method='auto', covariance='sample'):
+    return PortfolioProblem.from_returns(
+        returns, covariance=covariance).maximum_diversification(method)
 
-    def portfolio_volatility(weights, returns):
-        return calculate_portfolio_metrics(returns, weights)[1]
 
-    optimal_weights = minimize(portfolio_volatility, initial_guess, args=args,
-                               method='SLSQP', bounds=bounds, constraints=constraints)
-    return optimal_weights.x
+@timed()
+def hierarchical_risk_parity_portfolio(returns, covariance='sample', clusters=None):
+    """
+    Perform Hierarchical Risk Parity to find the portfolio weights.
+
+    :param returns: DataFrame of historical returns.
+    :param covariance: Covariance estimator, see features.covariance.estimate_covariance.
+    :param clusters: Optional CorrelationClusters of the returns whose order is reused.
+    :return: Weights for the portfolio.
+    """
+    order = clusters.order if clusters is not None else None
+    return PortfolioProblem.from_returns(
+        returns, covariance=covariance).hierarchical_risk_parity(order)
+
+
+_previous_weights = {}
+
+
+def _solve_warm_started(name, moments, solve):
+    """
+    Solve a dashboard optimization from the weights it had before the data or
+    the universe changed: symbols that are kept start from their previous
+    weights and new symbols from an equal share.
+    """
+    previous = _previous_weights.get(name)
+    x0 = None
+    if previous is not None:
+        x0 = np.array([previous.get(symbol, 1. / len(moments.symbols))
+                       for symbol in moments.symbols])
+        x0 = x0 / x0.sum()
+    weights = solve(PortfolioProblem(moments.mean, moments.covariance), x0)
+    _previous_weights[name] = dict(zip(moments.symbols, weights))
+    return weights
 
 
-def minimum_variance_portfolio(returns):
-    num_assets = len(returns.columns)
-    args = (returns,)
-    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-    bounds = tuple((0, 1) for asset in range(num_assets))
-    initial_guess = num_assets * [1. / num_assets,]
+@node(deps=[return_moments_node])
+def optimal_weights_mvo_node(moments):
+    return _solve_warm_started('mvo', moments, lambda problem, x0: problem.minimum_variance(x0=x0))
 
-    def portfolio_volatility(weights, returns):
-        return calculate_portfolio_metrics(returns, weights)[1]
 
-    optimal_weights = minimize(portfolio_volatility, initial_guess, args=args,
-                               method='SLSQP', bounds=bounds, constraints=constraints)
-    return optimal_weights.x
+@node(deps=[return_moments_node])
+def optimal_weights_mvp_node(moments):
+    return _solve_warm_started('mvp', moments, lambda problem, x0: problem.minimum_variance(x0=x0))
 
 
-def maximum_diversification_portfolio(returns):
-    num_assets = len(returns.columns)
-    args = (returns,)
-    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-    bounds = tuple((0, 1) for asset in range(num_assets))
-    initial_guess = num_assets * [1. / num_assets,]
+@node(deps=[return_moments_node])
+def optimal_weights_max_div_node(moments):
+    return _solve_warm_started('max_div', moments,
+                               lambda problem, x0: problem.maximum_diversification(x0=x0))
 
-    def diversification_ratio(weights, returns):
-        weighted_volatilities = np.dot(weights, returns.std() * np.sqrt(252))
-        portfolio_volatility = np.sqrt(
-            np.dot(weights.T, np.dot(returns.cov() * 252, weights)))
-        return -weighted_volatilities / portfolio_volatility  # Negative for maximization
 
-    optimal_weights = minimize(diversification_ratio, initial_guess, args=args,
-                               method='SLSQP', bounds=bounds, constraints=constraints)
-    return optimal_weights.x
+@node(deps=[return_moments_node, correlation_clusters_node])
+def optimal_weights_hrp_node(moments, clusters):
+    return PortfolioProblem(moments.mean, moments.covariance).hierarchical_risk_parity(clusters.order)
 
 
-optimal_weights_mvo = mean_variance_optimization(historical_returns)
-optimal_weights_mvp = minimum_variance_portfolio(historical_returns)
-optimal_weights_max_div = maximum_diversification_portfolio(historical_returns)
+__getattr__ = lazy_module_getattr(__name__, {
+    'optimal_weights_mvo': optimal_weights_mvo_node,
+    'optimal_weights_mvp': optimal_weights_mvp_node,
+    'optimal_weights_max_div': optimal_weights_max_div_node,
+    'optimal_weights_hrp': optimal_weights_hrp_node,
+})
@@ -0,0 +1,145 @@
+import os
+import pandas as pd
+
+
+def _to_close_series(data, symbol):
+    """ Normalise a downloaded price frame into a Series of closing prices. """
+    if data is None or len(data) == 0:
+        return pd.Series(dtype=float, name=symbol)
+    close = data['Close']
+    # Newer yfinance versions return a (field, ticker) column MultiIndex even
+    # for a single ticker, so 'Close' comes back as a one column DataFrame.
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    close = close.dropna()
+    close.index = pd.to_datetime(close.index).tz_localize(None).normalize()
+    close.name = symbol
+    return close
+
+
+def _yfinance_errors():
+    """
+    The yfinance exceptions for a range without prices and for an unknown
+    symbol, as tuples for ``except`` clauses. yfinance releases before 0.2.39
+    do not define them; they get empty tuples, so every error is retried.
+    """
+    try:
+        from yfinance.exceptions import YFPricesMissingError, YFTickerMissingError
+    except ImportError:
+        return (), ()
+    return (YFPricesMissingError,), (YFTickerMissingError,)
+
+
+class YahooFinanceProvider:
+    """ Price provider backed by the Yahoo Finance API. """
+
+    name = 'yahoo'
+    # fetch raises on download errors, so an empty result really has no bars.
+    confirms_empty_ranges = True
+
+    @property
+    def permanent_errors(self):
+        """ Errors a retry cannot fix: unknown or delisted symbols. """
+        return _yfinance_errors()[1]
+
+    def fetch(self, symbol, start_date, end_date):
+        """
+        Download closing prices for a single symbol.
+
+        A range without any bars, such as a weekend or a holiday, gives an
+        empty Series; download failures raise.
+
+        :param symbol: Stock or index symbol.
+        :param start_date: First date to fetch (inclusive).
+        :param end_date: Last date to fetch (exclusive, as in yfinance).
+        :return: A Series of closing prices indexed by date.
+        """
+        import yfinance as yf
+        prices_missing = _yfinance_errors()[0]
+        try:
+            data = yf.Ticker(symbol).history(start=start_date, end=end_date,
+                                             auto_adjust=False, raise_errors=True)
+        except prices_missing:
+            data = None
+        return _to_close_series(data, symbol)
+
+    def fetch_many(self, symbols, start_date, end_date):
+        """
+        Download closing prices for several symbols in one request.
+
+        Symbols the batched request returned no prices for are left out of
+        the result so that the caller can retry them one by one.
+
+        :return: A dictionary with symbols as keys and close Series as values.
+        """
+        import yfinance as yf
+        data = yf.download(list(symbols), start=start_date, end=end_date,
+                           auto_adjust=False, progress=False, threads=False)
+        if data is None or len(data) == 0:
+            return {}
+        close = data['Close']
+        if isinstance(close, pd.Series):
+            close = close.to_frame(symbols[0])
+        prices = {}
+        for symbol in symbols:
+            if symbol in close.columns and close[symbol].notna().any():
+                prices[symbol] = _to_close_series(
+                    close[symbol].to_frame('Close'), symbol)
+        return prices
+
+
+class FixtureProvider:
+    """
+    Offline price provider serving closing prices from local fixtures.
+
+    Fixtures are either passed in directly as a mapping of symbol to price
+    Series, or read from ``<fixture_dir>/<symbol>.csv`` files with ``Date``
+    and ``Close`` columns.
+    """
+
+    name = 'fixture'
+    permanent_errors = (KeyError, OSError)
+    confirms_empty_ranges = True
+
+    def __init__(self, fixture_dir=None, prices=None):
+        self.fixture_dir = fixture_dir
+        self.prices = dict(prices or {})
+        self.calls = []
+
+    def _load(self, symbol):
+        if symbol not in self.prices:
+            if self.fixture_dir is None:
+                raise KeyError(f"No fixture prices for {symbol}")
+            path = os.path.join(self.fixture_dir, f"{symbol}.csv")
+            frame = pd.read_csv(path, index_col='Date', parse_dates=True)
+            self.prices[symbol] = frame['Close']
+        return self.prices[symbol]
+
+    def fetch(self, symbol, start_date, end_date):
+        """ Return the fixture closing prices for ``[start_date, end_date)``. """
+        self.calls.append((symbol, start_date, end_date))
+        close = self._load(symbol)
+        close.index = pd.to_datetime(close.index)
+        mask = (close.index >= pd.Timestamp(start_date)) & (
+            close.index < pd.Timestamp(end_date))
+        return _to_close_series(close[mask].to_frame('Close'), symbol)
+
+    def fetch_many(self, symbols, start_date, end_date):
+        """ Return fixture closing prices for several symbols, skipping unknown ones. """
+        prices = {}
+        for symbol in symbols:
+            try:
+                prices[symbol] = self.fetch(symbol, start_date, end_date)
+            except (KeyError, OSError):
+                pass
+        return prices
+
+
+def provider_from_env():
+    """ Build the price provider selected by ``PORTFOLIO_PRICE_PROVIDER``. """
+    name = os.environ.get('PORTFOLIO_PRICE_PROVIDER', 'yahoo')
+    if name == 'yahoo':
+        return YahooFinanceProvider()
+    if name == 'fixture':
+        return FixtureProvider(os.environ.get('PORTFOLIO_FIXTURE_DIR', 'fixtures'))
+    raise ValueError(f"Unknown price provider: {name}")
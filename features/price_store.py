@@ -0,0 +1,288 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from features.price_providers import provider_from_env
+from features.instrumentation import metrics, timed
+
+
+def _day(date):
+    """ Convert a date-like value to a numpy day. """
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+def _save_array(path, array):
+    """ Write an array next to its final location and move it into place. """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_json(path, payload):
+    """ Write a JSON document next to its final location and move it into place. """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+class FetchReport:
+    """ Outcome of a multi-symbol fetch: which symbols were fetched, cached or failed. """
+
+    def __init__(self):
+        self.fetched = []
+        self.cached = []
+        self.failed = {}
+        self.stale = []
+        self.attempts = {}
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def summary(self):
+        return (f"{len(self.fetched)} fetched, {len(self.cached)} cached, "
+                f"{len(self.failed)} failed ({len(self.stale)} served stale)")
+
+
+class PriceStore:
+    """
+    On-disk cache of closing prices in front of a price provider.
+
+    Each symbol is stored as two memory-mapped ``.npy`` columns (dates and
+    closes) plus a small ``meta.json`` recording the date range that has
+    already been synced. Only the dates outside that range are requested
+    from the provider; everything else is read back from disk.
+    """
+
+    def __init__(self, cache_dir, provider=None):
+        self.cache_dir = cache_dir
+        self.provider = provider if provider is not None else provider_from_env()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9.-]', '_', symbol))
+
+    def _read_meta(self, symbol):
+        path = os.path.join(self._symbol_dir(symbol), 'meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _read_columns(self, symbol):
+        symbol_dir = self._symbol_dir(symbol)
+        dates = np.load(os.path.join(symbol_dir, 'dates.npy'), mmap_mode='r')
+        close = np.load(os.path.join(symbol_dir, 'close.npy'), mmap_mode='r')
+        return dates, close
+
+    def _write(self, symbol, dates, close, start, end):
+        symbol_dir = self._symbol_dir(symbol)
+        os.makedirs(symbol_dir, exist_ok=True)
+        _save_array(os.path.join(symbol_dir, 'dates.npy'), dates)
+        _save_array(os.path.join(symbol_dir, 'close.npy'), close)
+        _save_json(os.path.join(symbol_dir, 'meta.json'),
+                   {'symbol': symbol, 'start': str(start), 'end': str(end)})
+
+    def missing_ranges(self, symbol, start_date, end_date):
+        """ Return the ``[start, end)`` ranges not yet synced for a symbol. """
+        start, end = _day(start_date), _day(end_date)
+        meta = self._read_meta(symbol)
+        if meta is None:
+            return [(start, end)]
+        synced_start, synced_end = _day(meta['start']), _day(meta['end'])
+        ranges = []
+        if start < synced_start:
+            ranges.append((start, synced_start))
+        if end > synced_end:
+            ranges.append((synced_end, end))
+        return ranges
+
+    def sync(self, symbol, start_date, end_date):
+        """ Fetch and persist the dates missing for ``[start_date, end_date)``. """
+        ranges = self.missing_ranges(symbol, start_date, end_date)
+        if not ranges:
+            return
+        fetched = [((lo, hi), self.provider.fetch(symbol, str(lo), str(hi)))
+                   for lo, hi in ranges]
+        self.merge(symbol, fetched, start_date, end_date)
+
+    def _confirmed(self, date_range, series):
+        """
+        Whether a fetched range can be marked as synced: it returned prices,
+        it holds no weekday, or the provider guarantees that an empty result
+        means there were no bars rather than a failed download.
+        """
+        lo, hi = date_range
+        return (len(series) > 0 or np.busday_count(lo, hi) == 0
+                or getattr(self.provider, 'confirms_empty_ranges', False))
+
+    def merge(self, symbol, fetched, start_date, end_date):
+        """
+        Merge freshly fetched close Series into the cached columns.
+
+        The synced date range only grows over fetched ranges that are
+        confirmed (see ``_confirmed``), so a range that silently came back
+        empty is requested again on the next sync.
+
+        :param fetched: List of ``((lo, hi), series)`` pairs, one per range
+            returned by ``missing_ranges``.
+        """
+        meta = self._read_meta(symbol)
+        parts = [series for _, series in fetched if len(series)]
+        if meta is not None:
+            dates, close = self._read_columns(symbol)
+            parts.insert(0, pd.Series(np.asarray(close), index=pd.DatetimeIndex(
+                np.asarray(dates))))
+            start, end = _day(meta['start']), _day(meta['end'])
+        else:
+            # Nothing is synced yet: an empty range at the requested start.
+            start = end = _day(start_date)
+        for (lo, hi), series in fetched:
+            if not self._confirmed((lo, hi), series):
+                continue
+            if meta is None:
+                start, end = lo, hi
+            elif hi <= start:
+                start = lo
+            else:
+                end = hi
+        if parts:
+            merged = pd.concat(parts)
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        else:
+            merged = pd.Series(dtype=float)
+        self._write(symbol, merged.index.values.astype('datetime64[D]'),
+                    merged.values.astype(np.float64), start, end)
+
+    def _fetch_with_retry(self, symbol, lo, hi, retries, backoff, report):
+        """
+        Fetch one symbol, retrying with exponential backoff on errors. The
+        provider's ``permanent_errors``, such as an unknown symbol, are not retried.
+        """
+        permanent = getattr(self.provider, 'permanent_errors', ())
+        for attempt in range(retries + 1):
+            report.attempts[symbol] = report.attempts.get(symbol, 0) + 1
+            try:
+                return self.provider.fetch(symbol, str(lo), str(hi))
+            except Exception as e:
+                if attempt == retries or isinstance(e, permanent):
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+
+    def _sync_batch(self, symbols, ranges, start_date, end_date, retries, backoff,
+                    report):
+        """ Sync a batch of symbols sharing the same missing date ranges. """
+        fetched = {symbol: [] for symbol in symbols}
+        failed = {}
+        for lo, hi in ranges:
+            try:
+                prices = self.provider.fetch_many(symbols, str(lo), str(hi))
+            except Exception:
+                prices = {}
+            for symbol in symbols:
+                if symbol in failed:
+                    continue
+                if symbol in prices:
+                    report.attempts[symbol] = report.attempts.get(symbol, 0) + 1
+                    fetched[symbol].append(((lo, hi), prices[symbol]))
+                    continue
+                try:
+                    fetched[symbol].append(((lo, hi), self._fetch_with_retry(
+                        symbol, lo, hi, retries, backoff, report)))
+                except Exception as e:
+                    failed[symbol] = repr(e)
+        for symbol in symbols:
+            if symbol in failed:
+                report.failed[symbol] = failed[symbol]
+                continue
+            self.merge(symbol, fetched[symbol], start_date, end_date)
+            report.fetched.append(symbol)
+
+    @timed()
+    def load_many(self, symbols, start_date, end_date, max_workers=8, batch_size=20,
+                  retries=3, backoff=0.5):
+        """
+        Load closing prices for many symbols, fetching missing dates concurrently.
+
+        Symbols that share the same missing date ranges are requested together
+        in batches of ``batch_size``; the batches run on a bounded thread pool.
+        Symbols a batch did not return are retried one by one with exponential
+        backoff before being reported as failed. Failed symbols that already
+        have cached prices are still returned and reported as stale.
+
+        :param symbols: List of stock symbols.
+        :param start_date: Start date in 'YYYY-MM-DD' format (inclusive).
+        :param end_date: End date in 'YYYY-MM-DD' format (exclusive).
+        :param max_workers: Maximum number of concurrent provider requests.
+        :param batch_size: Maximum number of symbols per provider request.
+        :param retries: Number of retries for a single symbol.
+        :param backoff: Initial retry delay in seconds, doubled on each retry.
+        :return: A tuple of the price data dictionary and a FetchReport.
+        """
+        report = FetchReport()
+        pending = {}
+        for symbol in symbols:
+            ranges = tuple(self.missing_ranges(symbol, start_date, end_date))
+            if ranges:
+                pending.setdefault(ranges, []).append(symbol)
+            else:
+                report.cached.append(symbol)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for ranges, group in pending.items():
+                for i in range(0, len(group), batch_size):
+                    futures.append(executor.submit(
+                        self._sync_batch, group[i:i + batch_size], ranges,
+                        start_date, end_date, retries, backoff, report))
+            for future in futures:
+                future.result()
+
+        data = {}
+        for symbol in symbols:
+            if symbol in report.failed:
+                if self._read_meta(symbol) is None:
+                    continue
+                report.stale.append(symbol)
+            data[symbol] = self.load_cached(symbol, start_date, end_date)
+        for outcome, outcome_symbols in (('cached', report.cached), ('fetched', report.fetched),
+                                         ('failed', report.failed), ('stale', report.stale)):
+            metrics.increment('portfolio_price_symbols_total', outcome, len(outcome_symbols),
+                              help='Symbols loaded from the price store, by outcome.')
+        return data, report
+
+    def load(self, symbol, start_date, end_date):
+        """
+        Load closing prices for a symbol, syncing missing dates first.
+
+        :param symbol: Stock or index symbol.
+        :param start_date: Start date in 'YYYY-MM-DD' format (inclusive).
+        :param end_date: End date in 'YYYY-MM-DD' format (exclusive).
+        :return: A DataFrame with a 'Close' column indexed by date.
+        """
+        self.sync(symbol, start_date, end_date)
+        return self.load_cached(symbol, start_date, end_date)
+
+    def load_cached(self, symbol, start_date, end_date):
+        """ Load the cached closing prices for a symbol without syncing. """
+        dates, close = self._read_columns(symbol)
+        lo, hi = np.searchsorted(dates, [_day(start_date), _day(end_date)])
+        index = pd.DatetimeIndex(np.asarray(dates[lo:hi]), name='Date')
+        return pd.DataFrame({'Close': np.asarray(close[lo:hi])}, index=index)
+
+
+_default_store = None
+
+
+def default_price_store():
+    """ Return the process-wide price store configured from the environment. """
+    global _default_store
+    if _default_store is None:
+        cache_dir = os.environ.get('PORTFOLIO_CACHE_DIR', '.price_cache')
+        _default_store = PriceStore(cache_dir)
+    return _default_store
@@ -0,0 +1,21 @@
+from concurrent.futures import ProcessPoolExecutor
+import threading
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def shared_executor(max_workers):
+    """
+    Return the process pool of ``max_workers`` workers shared by every caller
+    in this process.
+
+    The pool is started on first use and reused by later requests, so worker
+    processes are not started again for every computation. A pool that broke,
+    e.g. because a worker was killed, is replaced.
+    """
+    with _lock:
+        executor = _executors.get(max_workers)
+        if executor is None or executor._broken:
+            executor = _executors[max_workers] = ProcessPoolExecutor(max_workers=max_workers)
+        return executor
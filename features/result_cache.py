@@ -0,0 +1,91 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """
+    Thread-safe, bounded least-recently-used cache of computed results.
+
+    Keys should capture everything the result depends on (for example the
+    optimization method, the data version and the universe), so entries never
+    need explicit invalidation; stale ones simply age out.
+
+    ``get_or_compute`` is single-flight: concurrent misses on one key compute
+    the value once, while the other callers wait for it.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-key lock and number of callers using it, for keys being computed.
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+
+        The first caller to miss computes the value under the key's lock; the
+        callers that missed meanwhile wait on the lock and then read the
+        stored value, which counts as a hit. If the computation raises, the
+        next waiter computes the value again.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            key_lock, callers = self._pending.get(key, (threading.Lock(), 0))
+            self._pending[key] = (key_lock, callers + 1)
+        try:
+            with key_lock:
+                with self._lock:
+                    value = self._data.get(key, sentinel)
+                    if value is not sentinel:
+                        self._data.move_to_end(key)
+                        self.misses -= 1
+                        self.hits += 1
+                if value is sentinel:
+                    value = compute()
+                    self.put(key, value)
+                return value
+        finally:
+            with self._lock:
+                key_lock, callers = self._pending[key]
+                if callers == 1:
+                    del self._pending[key]
+                else:
+                    self._pending[key] = (key_lock, callers - 1)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,156 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from features.compute import node
+from features.covariance import estimate_covariance
+from features.data_retrieval import historical_returns_node, market_index_returns_node
+
+# Storage precision of the dashboard's returns matrix: 'float64' or 'float32'.
+default_returns_dtype = os.environ.get('PORTFOLIO_RETURNS_DTYPE', 'float64')
+
+
+class ReturnsMatrix:
+    """
+    Daily returns of a universe held as one contiguous, read-only T x N array.
+
+    All assets share one trading calendar, and the benchmark is aligned to it
+    once when the matrix is built; ``benchmark_rows`` are the rows on which
+    the benchmark has a return. Row windows, columns and the DataFrame view
+    (``frame``) are views of the same buffer, never copies.
+
+    Moments are computed in float64 even when the returns are stored in
+    float32, and cached: the mean, the sample covariance and every covariance
+    estimate requested through features.covariance.estimate_covariance are
+    computed at most once per matrix.
+
+    The DataFrame-like methods (``columns``, ``index``, ``mean``, ``cov``,
+    ``std`` and ``__array__``) let it stand in for the returns DataFrame in
+    the feature modules.
+    """
+
+    def __init__(self, values, index, symbols, benchmark=None, dtype=np.float64):
+        self.values = np.ascontiguousarray(values, dtype=dtype)
+        self.values.flags.writeable = False
+        self.index = pd.DatetimeIndex(index)
+        self.columns = pd.Index(symbols)
+        self._cache = {}
+        self._lock = threading.RLock()
+        if benchmark is None:
+            self.benchmark_rows = slice(0, len(self.index))
+            self.benchmark = None
+        else:
+            benchmark = benchmark.reindex(self.index)
+            present = np.flatnonzero(benchmark.notna().values)
+            # A contiguous run of rows is kept as a slice so that views stay zero-copy.
+            if len(present) and present[-1] - present[0] + 1 == len(present):
+                self.benchmark_rows = slice(int(present[0]), int(present[-1]) + 1)
+            else:
+                self.benchmark_rows = present
+            self.benchmark = np.ascontiguousarray(benchmark.values[present], dtype=np.float64)
+
+    def __getstate__(self):
+        # The lock cannot be pickled, and cached moments are cheap to recompute.
+        state = self.__dict__.copy()
+        del state['_lock'], state['_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    @property
+    def benchmark_series(self):
+        """ The aligned benchmark returns as a Series, or None. """
+        if self.benchmark is None:
+            return None
+        return pd.Series(self.benchmark, index=self.index[self.benchmark_rows], name='Close')
+
+    @classmethod
+    def from_frame(cls, returns, benchmark=None, dtype=np.float64):
+        """
+        Build a matrix from a returns DataFrame and an optional benchmark Series,
+        which is aligned to the returns' dates.
+        """
+        return cls(returns.values, returns.index, returns.columns, benchmark, dtype)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def __len__(self):
+        return len(self.index)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or np.dtype(dtype) == self.values.dtype:
+            return self.values
+        return self.values.astype(dtype)
+
+    @property
+    def frame(self):
+        """ The returns as a DataFrame sharing this matrix's buffer. """
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
+
+    def window(self, start, stop):
+        """ Zero-copy matrix of the rows ``[start, stop)``, with its own moment cache. """
+        return ReturnsMatrix(self.values[start:stop], self.index[start:stop], self.columns,
+                             self.benchmark_series, self.values.dtype)
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    def mean(self):
+        """ Mean daily return of every asset (float64, cached). """
+        return self._cached('mean', lambda: self.values.mean(axis=0, dtype=np.float64))
+
+    def cov(self):
+        """ Sample covariance matrix of the daily returns (float64, cached). """
+        return self.covariance_estimate('sample').to_dense()
+
+    def std(self):
+        """ Sample standard deviation of every asset's daily returns (cached). """
+        return np.sqrt(self.covariance_estimate('sample').variances())
+
+    def corr(self):
+        """ Correlation matrix of the daily returns (cached). """
+        def compute():
+            std = self.std()
+            return self.cov() / np.outer(std, std)
+        return self._cached('corr', compute)
+
+    def covariance_estimate(self, method='sample', **kwargs):
+        """ Covariance backend of an estimator, computed once per matrix. """
+        return self._cached(('covariance', method, tuple(sorted(kwargs.items()))),
+                            lambda: estimate_covariance(self.values, method, **kwargs))
+
+    def portfolio(self, weights):
+        """ Daily returns of a portfolio (or of every row of a K x N weights matrix). """
+        return self.values @ np.asarray(weights, dtype=self.values.dtype).T
+
+    def aligned(self):
+        """ The asset returns and benchmark returns on the dates they share. """
+        return self.values[self.benchmark_rows], self.benchmark
+
+    def aligned_portfolio(self, weights):
+        """
+        Portfolio and benchmark daily returns on their common dates, as Series
+        ready for the return and rolling risk analyses.
+        """
+        values, benchmark = self.aligned()
+        index = self.index[self.benchmark_rows]
+        portfolio = values @ np.asarray(weights, dtype=values.dtype)
+        return (pd.Series(portfolio.astype(np.float64), index=index),
+                pd.Series(benchmark, index=index, name='Close'))
+
+
+@node(deps=[historical_returns_node, market_index_returns_node])
+def returns_matrix_node(returns, market_returns):
+    return ReturnsMatrix.from_frame(returns, market_returns, default_returns_dtype)
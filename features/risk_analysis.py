@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
+from features.instrumentation import timed
+from features.returns_matrix import ReturnsMatrix
 
 
 def calculate_portfolio_returns(daily_returns, weights):
     """ Calculate the daily portfolio returns. """
+    if isinstance(daily_returns, ReturnsMatrix):
+        return pd.Series(daily_returns.portfolio(weights), index=daily_returns.index)
     weighted_returns = daily_returns.multiply(weights, axis=1)
     portfolio_returns = weighted_returns.sum(axis=1)
     return portfolio_returns
@@ -49,3 +53,59 @@ def align_data(stock_returns, market_returns):
     """ Align the stock and market returns data for analysis. """
     aligned_data = pd.concat([stock_returns, market_returns], axis=1).dropna()
     return aligned_data.iloc[:, 0], aligned_data.iloc[:, 1]
+
+
+@timed()
+def calculate_risk_metrics_batch(daily_returns, weights, market_returns, risk_free_rate):
+    """
+    Calculate the risk metrics of many portfolios at once.
+
+    Produces the same values as calculate_standard_deviation, calculate_beta,
+    calculate_sharpe_ratio, calculate_sortino_ratio and calculate_treynor_ratio
+    applied to each portfolio in turn, using a handful of matrix operations
+    over all portfolios instead of one pandas Series per portfolio.
+
+    :param daily_returns: DataFrame of daily asset returns (T x N), or a
+        ReturnsMatrix whose already aligned benchmark is used.
+    :param weights: Weights matrix with one portfolio per row (K x N), or a
+        single weight vector.
+    :param market_returns: Series of daily market index returns; None to use
+        the benchmark of a ReturnsMatrix.
+    :param risk_free_rate: Risk-free rate used for the excess returns.
+    :return: A DataFrame with one row per portfolio and one column per metric.
+    """
+    if isinstance(daily_returns, ReturnsMatrix) and market_returns is None:
+        values, market = daily_returns.aligned()
+    else:
+        if isinstance(daily_returns, ReturnsMatrix):
+            daily_returns = daily_returns.frame
+        aligned = pd.concat([daily_returns, market_returns.rename('__market__')],
+                            axis=1, join='inner').dropna()
+        market = aligned.pop('__market__').values
+        values = aligned.values
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    portfolio = values @ weights.T  # T x K
+    num_days = portfolio.shape[0]
+
+    mean = portfolio.mean(axis=0)
+    deviations = portfolio - mean
+    standard_deviation = np.sqrt((deviations**2).sum(axis=0) / (num_days - 1))
+    excess_mean = mean - risk_free_rate
+
+    downside = portfolio < risk_free_rate
+    downside_count = downside.sum(axis=0)
+    downside_mean = np.where(downside, portfolio, 0).sum(axis=0) / downside_count
+    downside_std = np.sqrt(np.where(downside, (portfolio - downside_mean)**2, 0).sum(
+        axis=0) / downside_count)
+
+    market_deviations = market - market.mean()
+    covariance = market_deviations @ deviations / (num_days - 1)
+    beta = covariance / np.var(market)
+
+    return pd.DataFrame({
+        'Standard Deviation': standard_deviation,
+        'Beta': beta,
+        'Sharpe Ratio': excess_mean / standard_deviation * np.sqrt(252),
+        'Sortino Ratio': excess_mean / downside_std * np.sqrt(252),
+        'Treynor Ratio': excess_mean / beta,
+    })
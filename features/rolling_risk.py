@@ -0,0 +1,148 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from plotly.subplots import make_subplots
+import plotly.graph_objs as go
+from features.instrumentation import timed
+
+ROLLING_METRICS = ['Sharpe Ratio', 'Sortino Ratio', 'Volatility', 'Beta', 'Drawdown']
+
+
+class RollingRiskAccumulator:
+    """
+    Streaming rolling risk metrics of a portfolio against a market index.
+
+    Keeps running sums over the last ``window`` observations, so every update
+    costs O(1) regardless of the window length or the length of the history.
+    The metrics follow the definitions of the full-period functions in
+    features.risk_analysis; volatility is annualized and drawdown is measured
+    from the running peak of cumulative wealth since the first update.
+    ``periods_per_year`` annualizes the ratios and volatility: 252 for daily
+    returns, more for intraday ticks.
+    """
+
+    def __init__(self, window, risk_free_rate, periods_per_year=252):
+        self.window = window
+        self.risk_free_rate = risk_free_rate
+        self.periods_per_year = periods_per_year
+        self.values = deque()
+        self.sum_p = self.sum_p2 = self.sum_m = self.sum_m2 = self.sum_pm = 0.0
+        self.down_count = 0
+        self.down_sum = self.down_sum2 = 0.0
+        self.wealth = self.peak = 1.0
+
+    def _accumulate(self, p, m, sign):
+        self.sum_p += sign * p
+        self.sum_p2 += sign * p * p
+        self.sum_m += sign * m
+        self.sum_m2 += sign * m * m
+        self.sum_pm += sign * p * m
+        if p < self.risk_free_rate:
+            self.down_count += sign
+            self.down_sum += sign * p
+            self.down_sum2 += sign * p * p
+
+    def update(self, portfolio_return, market_return):
+        """ Add one observation, drop the oldest one, and return the current metrics. """
+        self.values.append((portfolio_return, market_return))
+        self._accumulate(portfolio_return, market_return, 1)
+        if len(self.values) > self.window:
+            self._accumulate(*self.values.popleft(), -1)
+        self.wealth *= 1 + portfolio_return
+        self.peak = max(self.peak, self.wealth)
+        return self.metrics()
+
+    def metrics(self):
+        """ Return the rolling metrics of the current window (NaN until it is full). """
+        n = len(self.values)
+        drawdown = self.wealth / self.peak - 1
+        if n < self.window or n < 2:
+            metrics = dict.fromkeys(ROLLING_METRICS, np.nan)
+            metrics['Drawdown'] = drawdown
+            return metrics
+        mean_p = self.sum_p / n
+        mean_m = self.sum_m / n
+        std_p = np.sqrt(max(self.sum_p2 - n * mean_p**2, 0) / (n - 1))
+        var_m = max(self.sum_m2 / n - mean_m**2, 0)
+        cov_pm = (self.sum_pm - n * mean_p * mean_m) / (n - 1)
+        downside_std = np.nan
+        if self.down_count:
+            down_mean = self.down_sum / self.down_count
+            downside_std = np.sqrt(max(self.down_sum2 / self.down_count - down_mean**2, 0))
+        excess_mean = mean_p - self.risk_free_rate
+        annualization = np.sqrt(self.periods_per_year)
+        return {
+            'Sharpe Ratio': excess_mean / std_p * annualization,
+            'Sortino Ratio': excess_mean / downside_std * annualization,
+            'Volatility': std_p * annualization,
+            'Beta': cov_pm / var_m,
+            'Drawdown': drawdown,
+        }
+
+
+def _window_sum(values, window):
+    """ Sum over a trailing window from a running (cumulative) sum, NaN until full. """
+    running = np.concatenate([[0.0], np.cumsum(values)])
+    sums = np.full(len(values), np.nan)
+    sums[window - 1:] = running[window:] - running[:-window]
+    return sums
+
+
+@timed()
+def calculate_rolling_metrics(portfolio_returns, market_returns, window, risk_free_rate):
+    """
+    Calculate rolling Sharpe, Sortino, volatility, beta and drawdown.
+
+    The vectorized counterpart of RollingRiskAccumulator: each window statistic
+    is the difference of two entries of a running sum, so every step costs O(1)
+    whatever the window length.
+
+    :param portfolio_returns: Series of daily portfolio returns.
+    :param market_returns: Series of daily market returns aligned with the portfolio.
+    :param window: Number of days in the rolling window.
+    :param risk_free_rate: Risk-free rate used for the excess returns.
+    :return: A DataFrame with one column per metric, indexed like the returns.
+    """
+    p = np.asarray(portfolio_returns, dtype=float)
+    m = np.asarray(market_returns, dtype=float)
+    # Centre the series before summing squares to limit cancellation error.
+    p_shift, m_shift = p.mean(), m.mean()
+    pc, mc = p - p_shift, m - m_shift
+    n = window
+
+    sum_p = _window_sum(pc, n)
+    sum_m = _window_sum(mc, n)
+    mean_p = sum_p / n
+    std_p = np.sqrt(np.maximum(_window_sum(pc**2, n) - n * mean_p**2, 0) / (n - 1))
+    var_m = np.maximum(_window_sum(mc**2, n) / n - (sum_m / n)**2, 0)
+    cov_pm = (_window_sum(pc * mc, n) - n * mean_p * (sum_m / n)) / (n - 1)
+
+    down = p < risk_free_rate
+    down_count = _window_sum(down.astype(float), n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        down_mean = _window_sum(np.where(down, pc, 0), n) / down_count
+        downside_std = np.sqrt(np.maximum(
+            _window_sum(np.where(down, pc**2, 0), n) / down_count - down_mean**2, 0))
+        excess_mean = mean_p + p_shift - risk_free_rate
+        metrics = {
+            'Sharpe Ratio': excess_mean / std_p * np.sqrt(252),
+            'Sortino Ratio': excess_mean / downside_std * np.sqrt(252),
+            'Volatility': std_p * np.sqrt(252),
+            'Beta': cov_pm / var_m,
+        }
+
+    wealth = np.cumprod(1 + p)
+    metrics['Drawdown'] = wealth / np.maximum.accumulate(np.maximum(wealth, 1)) - 1
+    return pd.DataFrame(metrics, index=getattr(portfolio_returns, 'index', None))
+
+
+@timed()
+def plot_rolling_metrics(rolling_metrics, title='Rolling Risk Metrics'):
+    """ Plot each rolling metric in its own row with a shared date axis. """
+    fig = make_subplots(rows=len(ROLLING_METRICS), cols=1, shared_xaxes=True,
+                        subplot_titles=ROLLING_METRICS, vertical_spacing=0.04)
+    for row, metric in enumerate(ROLLING_METRICS, start=1):
+        fig.add_trace(go.Scatter(x=rolling_metrics.index, y=rolling_metrics[metric],
+                                 mode='lines', name=metric), row=row, col=1)
+    fig.update_layout(title=title, height=180 * len(ROLLING_METRICS), showlegend=False)
+    return fig
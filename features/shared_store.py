@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+
+
+def _is_float_frame(value):
+    return (isinstance(value, (pd.DataFrame, pd.Series)) and len(value)
+            and all(dtype == np.float64 for dtype in np.atleast_1d(value.dtypes)))
+
+
+class SharedStore:
+    """
+    File-backed store of computed values shared by all processes on a host.
+
+    Values are written once and read by every process without copying:
+    arrays, float DataFrames/Series and ReturnsMatrix values are saved as
+    ``.npy`` files and memory-mapped read-only, so the pages are shared
+    through the OS page cache; anything else is pickled. Each entry records the fingerprint of
+    the ``key`` and store generation it was computed for.
+
+    Computation is coordinated with an exclusive ``fcntl`` lock per entry:
+    the first process to miss computes and writes the entry while the others
+    block on the lock and then read the result. ``refresh`` bumps the
+    generation so every entry is recomputed, once, on its next use; it can
+    also record an edited universe and the entries already computed for it,
+    which every process adopts when it sees the new generation.
+    """
+
+    def __init__(self, directory, key=()):
+        self.directory = directory
+        self.key = key
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def lock(self, name):
+        """ Hold the exclusive cross-process lock of an entry. """
+        with open(os.path.join(self.directory, f'{name}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @property
+    def generation(self):
+        try:
+            with open(os.path.join(self.directory, 'generation')) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def universe(self):
+        """ Symbols of the universe recorded by ``refresh`` for this key, or None. """
+        try:
+            with open(os.path.join(self.directory, 'universe.json')) as f:
+                universe = json.load(f)
+        except FileNotFoundError:
+            return None
+        return universe['symbols'] if universe['key'] == repr(self.key) else None
+
+    def refresh(self, universe=None, values=None):
+        """
+        Mark every entry stale; the next use of each recomputes it once.
+
+        :param universe: Symbols of an edited universe, adopted by every
+            process when it sees the new generation.
+        :param values: Dictionary of entry name to value already computed for
+            the new generation; they are saved before the generation is bumped.
+        :return: The new generation.
+        """
+        with self.lock('generation'):
+            generation = self.generation + 1
+            for name, value in (values or {}).items():
+                path = self._entry(name, self.fingerprint(name, generation))
+                with self.lock(name):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if not os.path.exists(path):
+                        self._save(path, value)
+                        self._prune(path)
+            if universe is not None:
+                self._replace('universe.json',
+                              json.dumps({'key': repr(self.key), 'symbols': list(universe)}))
+            self._replace('generation', str(generation))
+        return generation
+
+    def _replace(self, filename, content):
+        tmp = os.path.join(self.directory, f'{filename}.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, os.path.join(self.directory, filename))
+
+    def fingerprint(self, name, generation=None):
+        generation = self.generation if generation is None else generation
+        return hashlib.sha1(repr((name, self.key, generation)).encode()).hexdigest()
+
+    def _entry(self, name, fingerprint):
+        return os.path.join(self.directory, name, fingerprint)
+
+    def _load(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            kind = json.load(f)['kind']
+        if kind == 'pickle':
+            with open(os.path.join(path, 'value.pkl'), 'rb') as f:
+                return pickle.load(f)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        if kind == 'array':
+            return values
+        with open(os.path.join(path, 'labels.pkl'), 'rb') as f:
+            labels = pickle.load(f)
+        if kind == 'series':
+            return pd.Series(values, index=labels['index'], name=labels['name'], copy=False)
+        if kind == 'returns_matrix':
+            from features.returns_matrix import ReturnsMatrix
+            return ReturnsMatrix(values, labels['index'], labels['columns'], labels['benchmark'],
+                                 values.dtype)
+        return pd.DataFrame(values, index=labels['index'], columns=labels['columns'], copy=False)
+
+    def _save(self, path, value):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            self._write(tmp, value)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        os.replace(tmp, path)
+
+    def _write(self, tmp, value):
+        from features.returns_matrix import ReturnsMatrix
+        if isinstance(value, ReturnsMatrix):
+            kind = 'returns_matrix'
+            np.save(os.path.join(tmp, 'values.npy'), value.values)
+            labels = {'index': value.index, 'columns': value.columns,
+                      'benchmark': value.benchmark_series}
+            with open(os.path.join(tmp, 'labels.pkl'), 'wb') as f:
+                pickle.dump(labels, f)
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            kind = 'array'
+            np.save(os.path.join(tmp, 'values.npy'), value)
+        elif _is_float_frame(value):
+            kind = 'series' if isinstance(value, pd.Series) else 'frame'
+            np.save(os.path.join(tmp, 'values.npy'), np.ascontiguousarray(value.to_numpy()))
+            labels = {'index': value.index, 'name': getattr(value, 'name', None),
+                      'columns': getattr(value, 'columns', None)}
+            with open(os.path.join(tmp, 'labels.pkl'), 'wb') as f:
+                pickle.dump(labels, f)
+        else:
+            kind = 'pickle'
+            with open(os.path.join(tmp, 'value.pkl'), 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'kind': kind}, f)
+
+    def get_or_compute(self, name, compute):
+        """
+        Return the shared value of an entry, computing it in this process only
+        when no other process has done so for the current key and generation.
+        """
+        path = self._entry(name, self.fingerprint(name))
+        if os.path.exists(path):
+            try:
+                return self._load(path)
+            except FileNotFoundError:
+                # Pruned by a refresh since the check; entries are only
+                # removed under the lock, so the locked path below is safe.
+                path = self._entry(name, self.fingerprint(name))
+        with self.lock(name):
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._save(path, compute())
+                self._prune(path)
+            return self._load(path)
+
+    def _prune(self, path):
+        """ Remove the other entries of the same name, of older keys and generations. """
+        for old in os.listdir(os.path.dirname(path)):
+            old_path = os.path.join(os.path.dirname(path), old)
+            if old_path != path and not old.endswith('.tmp'):
+                _remove_entry(old_path)
+
+
+def _remove_entry(path):
+    for filename in os.listdir(path):
+        os.remove(os.path.join(path, filename))
+    os.rmdir(path)
@@ -0,0 +1,182 @@
+from collections import deque
+import os
+import numpy as np
+from features.instrumentation import timed
+from features.process_pool import shared_executor
+
+
+def _simulate_chunk(method, params, horizon, num_paths, seed):
+    """
+    Simulate one chunk of portfolio paths and reduce each path to its
+    terminal wealth and maximum drawdown. The chunk's full paths are
+    discarded before returning.
+    """
+    rng = np.random.default_rng(seed)
+    if method == 'bootstrap':
+        history = params['history']
+        daily = history[rng.integers(0, len(history), size=(num_paths, horizon))]
+    elif method == 'normal':
+        daily = rng.normal(params['mean'], params['std'], size=(num_paths, horizon))
+    elif method == 't':
+        dof = params['degrees_of_freedom']
+        scale = params['std'] * np.sqrt((dof - 2) / dof)
+        daily = params['mean'] + scale * rng.standard_t(dof, size=(num_paths, horizon))
+    else:
+        raise ValueError(f"Unknown simulation method: {method}")
+
+    wealth = np.cumprod(1 + daily, axis=1)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1), axis=1)
+    max_drawdown = np.max(1 - wealth / peak, axis=1)
+    return wealth[:, -1], max_drawdown
+
+
+class _Reservoir:
+    """
+    Uniform random sample of at most ``size`` of the rows streamed through it.
+
+    Every row gets a random key and the rows with the ``size`` smallest keys
+    are kept, so memory is bounded by ``size`` plus one chunk of rows. While
+    no more than ``size`` rows were added, all of them are kept.
+    """
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.rows = None
+
+    def add(self, rows):
+        keys = np.concatenate([self.keys, self.rng.random(len(rows))])
+        rows = rows if self.rows is None else np.concatenate([self.rows, rows])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, rows = keys[keep], rows[keep]
+        self.keys, self.rows = keys, rows
+
+
+class _LowerTail:
+    """
+    The ``size`` smallest values streamed through it, in no particular order;
+    memory is bounded by ``size`` plus one chunk of values.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = np.empty(0)
+
+    def add(self, values):
+        values = np.concatenate([self.values, values])
+        if len(values) > self.size:
+            values = np.partition(values, self.size - 1)[:self.size]
+        self.values = values
+
+
+def _tail_position(q, count):
+    """ Index and weight of the linearly interpolated ``q`` quantile of ``count`` sorted values. """
+    position = q * (count - 1)
+    index = int(np.floor(position))
+    return index, position - index
+
+
+def _chunk_results(args, processes):
+    """
+    Yield the results of the simulation chunks in order, computed in this
+    process or on the shared process pool with at most two chunks in flight
+    per worker.
+    """
+    if processes == 1 or len(args) == 1:
+        for chunk_args in args:
+            yield _simulate_chunk(*chunk_args)
+        return
+    executor = shared_executor(processes)
+    pending = deque()
+    for chunk_args in args:
+        pending.append(executor.submit(_simulate_chunk, *chunk_args))
+        if len(pending) >= 2 * processes:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+@timed()
+def simulate_portfolio_risk(returns, weights, num_paths=100000, horizon=252,
+                            method='bootstrap', degrees_of_freedom=5, seed=0,
+                            chunk_size=10000, processes=None, sample_size=100000,
+                            confidence_levels=(0.95, 0.99)):
+    """
+    Monte Carlo Value-at-Risk, CVaR, drawdown and terminal wealth of a portfolio.
+
+    Paths are generated in chunks of ``chunk_size``, on the shared process
+    pool when there is more than one chunk, and each chunk is reduced to
+    per-path terminal wealth and maximum drawdown right away. VaR and CVaR
+    are exact over all paths: only the worst terminal returns, as many as the
+    deepest confidence level needs, are kept from each chunk. The other
+    metrics come from a reservoir of ``sample_size`` paths, so they are exact
+    when ``num_paths`` does not exceed ``sample_size`` and otherwise estimated
+    from a uniform random sample of the paths; memory does not grow with
+    ``num_paths`` beyond the tail of the worst paths.
+
+    Daily portfolio returns are drawn so that the correlation between the
+    assets is preserved: 'bootstrap' resamples whole historical days of asset
+    returns, while 'normal' and 't' draw from the multivariate distribution
+    fitted to the asset returns, whose projection on the weights is the
+    univariate distribution with mean ``w' mu`` and variance ``w' S w``.
+
+    Every chunk gets its own child of ``SeedSequence(seed)``, so results are
+    reproducible and independent of the number of processes.
+
+    :param returns: DataFrame of historical daily asset returns.
+    :param weights: Weights of each asset in the portfolio.
+    :param num_paths: Number of simulated paths.
+    :param horizon: Number of trading days per path.
+    :param method: 'bootstrap', 'normal' or 't'.
+    :param degrees_of_freedom: Degrees of freedom of the 't' method.
+    :param seed: Seed of the simulation.
+    :param chunk_size: Number of paths generated at once.
+    :param processes: Number of worker processes; 1 simulates in this process.
+        Defaults to the number of CPUs.
+    :param sample_size: Number of paths kept for the terminal wealth and
+        drawdown quantiles.
+    :param confidence_levels: Confidence levels of VaR and CVaR.
+    :return: A dictionary of metric name to value.
+    """
+    weights = np.asarray(weights, dtype=float)
+    history = np.asarray(returns, dtype=float) @ weights
+    if method == 'bootstrap':
+        params = {'history': history}
+    else:
+        cov = np.cov(np.asarray(returns, dtype=float), rowvar=False)
+        params = {'mean': np.asarray(returns).mean(axis=0) @ weights,
+                  'std': np.sqrt(weights @ cov @ weights),
+                  'degrees_of_freedom': degrees_of_freedom}
+
+    sizes = [chunk_size] * (num_paths // chunk_size)
+    if num_paths % chunk_size:
+        sizes.append(num_paths % chunk_size)
+    *seeds, reservoir_seed = np.random.SeedSequence(seed).spawn(len(sizes) + 1)
+    args = [(method, params, horizon, size, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)]
+
+    reservoir = _Reservoir(sample_size, reservoir_seed)
+    # Enough of the worst terminal returns for the deepest VaR cutoff and the
+    # next order statistic it is interpolated with.
+    deepest, _ = _tail_position(1 - min(confidence_levels), num_paths)
+    tail = _LowerTail(min(deepest + 2, num_paths))
+    for terminal, drawdown in _chunk_results(args, processes or os.cpu_count() or 1):
+        reservoir.add(np.column_stack([terminal, drawdown]))
+        tail.add(terminal - 1)
+    terminal_wealth, max_drawdown = reservoir.rows.T
+    worst_returns = np.sort(tail.values)
+
+    metrics = {}
+    for level in confidence_levels:
+        index, weight = _tail_position(1 - level, num_paths)
+        upper = worst_returns[min(index + 1, len(worst_returns) - 1)]
+        cutoff = worst_returns[index] + weight * (upper - worst_returns[index])
+        metrics[f'VaR {level:.0%}'] = -cutoff
+        metrics[f'CVaR {level:.0%}'] = -worst_returns[worst_returns <= cutoff].mean()
+    for q in (0.05, 0.5, 0.95):
+        metrics[f'Terminal Wealth {q:.0%} Quantile'] = np.quantile(terminal_wealth, q)
+    metrics['Median Max Drawdown'] = np.median(max_drawdown)
+    metrics['Max Drawdown 95% Quantile'] = np.quantile(max_drawdown, 0.95)
+    return metrics
@@ -0,0 +1,173 @@
+import threading
+import numpy as np
+from features import data_retrieval
+from features.compute import invalidate_all, node
+from features.covariance import DenseCovariance, default_covariance_method, estimate_covariance
+from features.data_retrieval import historical_returns_node, stock_symbols
+from features.price_store import default_price_store
+from features.returns_matrix import returns_matrix_node
+
+_lock = threading.Lock()
+
+# Bumped before and after every published edit: odd while an edit is being
+# published. Readers use it to detect values read across an edit.
+_generation = 0
+
+
+class ReturnMoments:
+    """
+    Daily mean vector and covariance backend of the returns of a universe,
+    with one entry per symbol in ``symbols``.
+    """
+
+    def __init__(self, symbols, mean, covariance, method='sample'):
+        self.symbols = list(symbols)
+        self.mean = np.asarray(mean, dtype=float)
+        self.covariance = covariance
+        self.method = method
+
+    @classmethod
+    def from_returns(cls, returns, method='sample'):
+        return cls(returns.columns, np.asarray(returns.mean()),
+                   estimate_covariance(returns, method), method)
+
+    def with_asset(self, returns):
+        """
+        Moments after adding the last column of ``returns``, whose other columns
+        are the returns these moments were computed from.
+
+        The sample covariance is extended by one row and column, an O(T N)
+        product instead of the O(T N^2) of a full estimate. Other estimators
+        depend on every asset jointly and are re-estimated.
+        """
+        if self.method != 'sample':
+            return ReturnMoments.from_returns(returns, self.method)
+        values = np.asarray(returns, dtype=float)
+        new = values[:, -1] - values[:, -1].mean()
+        cross = (values[:, :-1] - self.mean).T @ new / (len(values) - 1)
+        matrix = self.covariance.to_dense()
+        extended = np.empty((len(matrix) + 1, len(matrix) + 1))
+        extended[:-1, :-1] = matrix
+        extended[:-1, -1] = extended[-1, :-1] = cross
+        extended[-1, -1] = new @ new / (len(values) - 1)
+        return ReturnMoments(returns.columns, np.append(self.mean, values[:, -1].mean()),
+                             DenseCovariance(extended), self.method)
+
+    def without_asset(self, symbol, returns):
+        """
+        Moments after removing ``symbol``; ``returns`` are the remaining returns.
+        The sample covariance only drops one row and column.
+        """
+        if self.method != 'sample':
+            return ReturnMoments.from_returns(returns, self.method)
+        keep = [i for i, other in enumerate(self.symbols) if other != symbol]
+        return ReturnMoments(returns.columns, self.mean[keep],
+                             self.covariance.subset(keep), self.method)
+
+
+@node(deps=[returns_matrix_node])
+def return_moments_node(returns):
+    return ReturnMoments.from_returns(returns, default_covariance_method)
+
+
+def _publish(returns, moments):
+    """ Replace the returns and moments in the compute graph; called under ``_lock``. """
+    global _generation
+    _generation += 1
+    try:
+        store = historical_returns_node.store
+        if store is not None:
+            # Hand the edit to the other processes sharing the store; they
+            # load these values instead of fetching the universe again.
+            store.refresh(universe=returns.columns, values={
+                historical_returns_node.name: returns, return_moments_node.name: moments})
+        historical_returns_node.set(returns)
+        return_moments_node.set(moments)
+        stock_symbols[:] = list(returns.columns)
+    finally:
+        _generation += 1
+
+
+def reload(symbols=None):
+    """
+    Drop every computed value, optionally switching the universe to ``symbols``,
+    e.g. after another process refreshed or edited the shared store.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        try:
+            if symbols is not None:
+                stock_symbols[:] = list(symbols)
+            invalidate_all()
+        finally:
+            _generation += 1
+
+
+def consistent_get(*nodes):
+    """
+    Get the values of several nodes computed from the same universe.
+
+    Reading nodes one by one can pair values from before and after an edit,
+    such as old weights with new symbols. The values are read again when an
+    edit was published while they were being read.
+    """
+    while True:
+        generation = _generation
+        if generation % 2:
+            # Wait for the edit being published to finish.
+            with _lock:
+                continue
+        values = tuple(node.get() for node in nodes)
+        if generation == _generation:
+            return values
+
+
+def add_symbol(symbol, store=None):
+    """
+    Add a symbol to the universe, fetching only that symbol's prices.
+
+    When its returns cover the whole current sample, the cached moments are
+    extended by one row and column; otherwise the sample shrinks to the
+    common dates and the moments are re-estimated. Nodes computed from the
+    returns are invalidated and re-solved on their next use.
+
+    :param symbol: Stock symbol to add.
+    :param store: Price store, defaults to the shared local price store.
+    :raises ValueError: When the symbol is already in the universe or has no prices.
+    """
+    with _lock:
+        if symbol in stock_symbols:
+            raise ValueError(f"{symbol} is already in the universe")
+        store = store if store is not None else default_price_store()
+        prices = store.load(symbol, data_retrieval.start_date, data_retrieval.end_date)
+        if prices.empty:
+            raise ValueError(f"No prices found for {symbol}")
+        returns = historical_returns_node.get()
+        moments = return_moments_node.get()
+        new_returns = prices['Close'].pct_change().reindex(returns.index)
+        extended = returns.assign(**{symbol: new_returns})
+        if new_returns.isna().any():
+            extended = extended.dropna()
+            moments = ReturnMoments.from_returns(extended, moments.method)
+        else:
+            moments = moments.with_asset(extended)
+        _publish(extended, moments)
+
+
+def remove_symbol(symbol):
+    """
+    Remove a symbol from the universe, dropping its row and column of the
+    cached moments. The sample period of the other symbols is kept.
+
+    :raises ValueError: When the symbol is not in the universe or is the last one.
+    """
+    with _lock:
+        returns = historical_returns_node.get()
+        if symbol not in returns.columns:
+            raise ValueError(f"{symbol} is not in the universe")
+        if len(returns.columns) == 1:
+            raise ValueError("The universe needs at least one symbol")
+        moments = return_moments_node.get()
+        remaining = returns.drop(columns=[symbol])
+        _publish(remaining, moments.without_asset(symbol, remaining))
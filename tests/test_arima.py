@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+arima = pytest.importorskip('arima')
+
+
+def fake_fits(monkeypatch, aic, failing):
+    """ Replace the ARIMA fits with results whose AIC is ``aic[(p, q)]``. """
+    def fit(series, order, previous=None):
+        p, _, q = order
+        if (p, q) in failing:
+            raise np.linalg.LinAlgError('Schur decomposition solver error.')
+        return SimpleNamespace(order=order, aic=aic[p, q])
+    monkeypatch.setattr(arima, '_fit_arima', fit)
+
+
+def test_select_arima_order_skips_failed_fits(monkeypatch):
+    aic = {(p, q): 10. - p - q for p in range(3) for q in range(3)}
+    fake_fits(monkeypatch, aic, failing={(0, 0), (1, 1)})
+    assert arima.select_arima_order(None, 1, max_p=2, max_q=2).order == (2, 1, 2)
+
+
+def test_select_arima_order_raises_when_no_order_fits(monkeypatch):
+    fake_fits(monkeypatch, {}, failing={(p, q) for p in range(2) for q in range(2)})
+    with pytest.raises(ValueError, match='No ARIMA order'):
+        arima.select_arima_order(None, 1, max_p=1, max_q=1)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import generate_returns
+from features import portfolio_construction
+from features.portfolio_construction import PortfolioProblem, _solve_warm_started
+from features.universe import ReturnMoments
+
+
+@pytest.fixture
+def moments():
+    returns = generate_returns(30, 120)
+    moments = ReturnMoments.from_returns(returns)
+    # On a short window the unconstrained minimum variance shorts some assets,
+    # so 'auto' cannot stop at the closed form.
+    assert PortfolioProblem(moments.mean, moments.covariance)._long_only_qp(
+        np.ones(30), 'closed_form') is None
+    return moments
+
+
+def test_warm_started_resolve_uses_slsqp(moments, monkeypatch):
+    monkeypatch.setattr(portfolio_construction, '_previous_weights', {})
+    problems = []
+
+    def solve(problem, x0):
+        problems.append(problem)
+        return problem.minimum_variance(x0=x0)
+
+    cold = _solve_warm_started('test', moments, solve)
+    warm = _solve_warm_started('test', moments, solve)
+    assert [problem.last_method for problem in problems] == ['qp', 'slsqp']
+    assert warm.sum() == pytest.approx(1.)
+    assert warm.min() >= -1e-8
+    variance = lambda w: moments.covariance.quad_form(w)
+    assert variance(warm) == pytest.approx(variance(cold), rel=1e-3)
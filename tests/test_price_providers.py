@@ -0,0 +1,31 @@
+import os
+import re
+import pytest
+from features.price_providers import FixtureProvider, YahooFinanceProvider
+
+REQUIREMENTS = os.path.join(os.path.dirname(__file__), os.pardir, 'requirements.txt')
+
+
+def pinned_version(package):
+    with open(REQUIREMENTS) as f:
+        for line in f:
+            name, _, version = line.strip().partition('==')
+            if name.lower() == package:
+                return tuple(int(part) for part in re.findall(r'\d+', version))
+    raise LookupError(package)
+
+
+def test_pinned_yfinance_defines_the_missing_data_exceptions():
+    # YFTickerMissingError and YFPricesMissingError first ship in yfinance 0.2.39.
+    assert pinned_version('yfinance') >= (0, 2, 39)
+
+
+def test_yahoo_permanent_errors_resolve_with_the_installed_yfinance():
+    pytest.importorskip('yfinance')
+    errors = YahooFinanceProvider().permanent_errors
+    assert errors
+    assert all(issubclass(error, Exception) for error in errors)
+
+
+def test_fixture_provider_permanent_errors():
+    assert FixtureProvider('fixtures').permanent_errors == (KeyError, OSError)
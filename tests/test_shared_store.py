@@ -0,0 +1,22 @@
+import numpy as np
+from features.shared_store import SharedStore
+
+
+def test_get_or_compute_survives_a_refresh_pruning_the_entry(tmp_path):
+    store = SharedStore(str(tmp_path), key=('A', 'B'))
+    store.get_or_compute('values', lambda: np.arange(3.))
+    load = store._load
+    calls = []
+
+    def load_after_refresh(path):
+        # Another process refreshes the store between the existence check
+        # and the load, pruning the entry this process found.
+        if not calls:
+            store.refresh(values={'values': np.ones(3)})
+        calls.append(path)
+        return load(path)
+
+    store._load = load_after_refresh
+    value = store.get_or_compute('values', lambda: np.zeros(3))
+    np.testing.assert_array_equal(value, np.ones(3))
+    assert len(calls) == 2 and calls[0] != calls[1]
@@ -0,0 +1,14 @@
+import pytest
+from benchmarks.synthetic import generate_returns
+from features.simulation import simulate_portfolio_risk
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 't'])
+def test_tail_metrics_are_exact_beyond_the_sample_size(method):
+    returns = generate_returns(5, 500)
+    weights = [0.2] * 5
+    kwargs = dict(num_paths=30000, horizon=20, method=method, chunk_size=4000, processes=1)
+    sampled = simulate_portfolio_risk(returns, weights, sample_size=2000, **kwargs)
+    full = simulate_portfolio_risk(returns, weights, sample_size=30000, **kwargs)
+    for name in ('VaR 95%', 'CVaR 95%', 'VaR 99%', 'CVaR 99%'):
+        assert sampled[name] == pytest.approx(full[name], rel=1e-12)
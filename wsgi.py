@@ -0,0 +1,73 @@
+"""
+Production entry point for serving the dashboard with a multi-worker WSGI server:
+
+    gunicorn --workers 4 --bind 0.0.0.0:8050 wsgi:server
+
+All workers share one file-backed store of computed values (returns,
+optimal weights, efficient frontier, ...) in PORTFOLIO_SHARED_DIR. The first
+worker to need a value computes it under a file lock; the others read the
+memory-mapped result. To reload the data in every worker, run
+
+    python wsgi.py --refresh
+
+Universe edits made in one worker are saved to the store with a new
+generation, and the other workers switch to the edited universe.
+
+Live mode keeps its sessions in the memory of one process, so it is off
+here unless PORTFOLIO_LIVE_MODE=1 is set for a server run with one worker.
+"""
+import argparse
+from datetime import datetime
+import os
+from features import data_retrieval
+from features.compute import share_nodes, warm_in_background
+from features.covariance import default_covariance_method
+from features.data_retrieval import stock_symbols, start_date
+from features.shared_store import SharedStore
+from features.universe import reload
+
+# Each worker would stream its own live session, so a client polling several
+# workers would get ticks from different sessions.
+os.environ.setdefault('PORTFOLIO_LIVE_MODE', '0')
+from app import app
+
+# The end date is not part of the key: moving it to today is a data update,
+# which the store generation versions.
+shared_store = SharedStore(
+    os.environ.get('PORTFOLIO_SHARED_DIR', '.shared_cache'),
+    key=(tuple(stock_symbols), start_date, default_covariance_method))
+share_nodes(shared_store)
+
+server = app.server
+_loaded_generation = None
+
+
+@server.before_request
+def sync_shared_store():
+    """
+    Drop this worker's node values after the store was refreshed or the
+    universe edited, extending the data up to today and switching to the
+    universe recorded in the store; whichever worker gets there first recomputes.
+    """
+    global _loaded_generation
+    generation = shared_store.generation
+    if generation != _loaded_generation:
+        _loaded_generation = generation
+        data_retrieval.end_date = datetime.now().strftime('%Y-%m-%d')
+        reload(shared_store.universe)
+
+
+sync_shared_store()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the shared store of the dashboard.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Recompute all shared values on their next use.')
+    args = parser.parse_args()
+    if args.refresh:
+        print(f'Shared store generation: {shared_store.refresh()}')
+    else:
+        server.run(host='0.0.0.0', port=8050)
+elif os.environ.get('PORTFOLIO_WARM_ON_START', '1') == '1':
+    warm_in_background()